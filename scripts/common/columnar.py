@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import pandas as pd
+
+# ===============================
+# Columnar copies of the export/ tables
+#
+# Each cleaning script still writes its CSV, plus a Parquet file next to it (same name, .parquet) that keeps
+# the dtypes: categoricals for the repetitive name columns, native dates, and FIPS codes as zero-padded
+# strings. read_table uses the Parquet copy when it is at least as new as the CSV, so nothing downstream has
+# to re-parse dates or re-infer types. Parquet needs pyarrow; without it only the CSVs are written and read.
+# ===============================
+CATEGORICAL_COLUMNS = ("State", "County", "Sex", "Ethnicity")
+
+
+def parquet_path(csv_path):
+    return Path(csv_path).with_suffix(".parquet")
+
+
+def write_table(df, csv_path, categoricals=CATEGORICAL_COLUMNS):
+    """Write `df` to csv_path, plus a typed, compressed Parquet copy alongside it."""
+    df.to_csv(csv_path, index=False)
+
+    columnar = df.astype({col: "category" for col in categoricals if col in df.columns})
+    try:
+        columnar.to_parquet(parquet_path(csv_path), index=False, compression="zstd")
+    except ImportError:
+        print(f"pyarrow not installed - wrote {csv_path} without a Parquet copy")
+
+
+def read_table(csv_path, categorical=True, **read_csv_kwargs):
+    """Read an export/ table, preferring its Parquet copy; read_csv_kwargs only apply to the CSV fallback.
+
+    With categorical=False, categorical columns come back as plain object columns, for callers that assign new
+    values into them.
+    """
+    csv_path = Path(csv_path)
+    columnar_path = parquet_path(csv_path)
+    if columnar_path.exists() and (
+        not csv_path.exists() or columnar_path.stat().st_mtime >= csv_path.stat().st_mtime
+    ):
+        try:
+            df = pd.read_parquet(columnar_path)
+        except ImportError:
+            pass
+        else:
+            if not categorical:
+                df = df.astype({col: object for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)})
+            return df
+
+    return pd.read_csv(csv_path, **read_csv_kwargs)
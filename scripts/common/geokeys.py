@@ -0,0 +1,96 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# ===============================
+# Integer geographic keys
+#
+# County, state, MSA and CSA codes as nullable Int32 instead of zero-padded strings, so joins and groupbys hash
+# integers and the key columns take a fraction of the memory. Encoding parses each distinct code once (codes
+# repeat heavily - every county appears once per year), and decoding formats each distinct key once.
+#   county  '01001' / 1001 / '1001.0'  -> 1001    (state * 1000 + county)
+#   state   '01' / 1                   -> 1
+#   MSA     'C1018' (QCEW: "C" + first 4 digits of the CBSA code) -> 1018
+#   CSA     'CS388' (QCEW: "CS" + 3-digit CSA code)                -> 388
+# Missing or unparseable codes, and codes with more digits than the key's width (e.g. 10-digit subdivision
+# GEOIDs passed as counties), become <NA>.
+# ===============================
+KEY_DTYPE = "Int32"
+
+COUNTY_WIDTH = 5
+STATE_WIDTH = 2
+MSA_PREFIX, MSA_WIDTH = "C", 4
+CSA_PREFIX, CSA_WIDTH = "CS", 3
+
+# optional letter prefix, the digits, and a ".0" left over from a float column
+_CODE = re.compile(r"^[A-Za-z]*(\d+)(?:\.0*)?$")
+
+
+def _parse_code(value, width):
+    # digits of a code as an int; floats from CSV round trips ('1001.0') keep only their integer part
+    if isinstance(value, (int, np.integer)):
+        key = int(value)
+    elif isinstance(value, (float, np.floating)):
+        if value != value:
+            return None
+        key = int(value)
+    else:
+        match = _CODE.match(str(value).strip())
+        if not match:
+            return None
+        key = int(match.group(1))
+    return key if 0 <= key < 10 ** width else None
+
+
+def encode(codes, width):
+    """Encode a Series of codes (strings or numbers, any prefix) into Int32 keys from their digits; codes
+    that don't fit in `width` digits become <NA>."""
+    factor_codes, uniques = pd.factorize(codes)
+    keys = pd.array([_parse_code(value, width) for value in uniques] + [None], dtype=KEY_DTYPE)
+    # the -1 code for missing values lands on the trailing <NA>
+    return pd.Series(keys[factor_codes], index=codes.index, name=codes.name)
+
+
+def decode(keys, width, prefix=""):
+    """Format Int32 keys back into zero-padded code strings, with NaN where the key is missing."""
+    factor_codes, uniques = pd.factorize(keys)
+    labels = np.array([f"{prefix}{int(key):0{width}d}" for key in uniques] + [np.nan], dtype=object)
+    return pd.Series(labels[factor_codes], index=keys.index, name=keys.name)
+
+
+def encode_county(fips):
+    return encode(fips, COUNTY_WIDTH)
+
+
+def decode_county(keys):
+    return decode(keys, COUNTY_WIDTH)
+
+
+def county_state(keys):
+    """State key of each county key."""
+    return keys // 1000
+
+
+def encode_state(fips):
+    return encode(fips, STATE_WIDTH)
+
+
+def decode_state(keys):
+    return decode(keys, STATE_WIDTH)
+
+
+def encode_msa(codes):
+    return encode(codes, MSA_WIDTH)
+
+
+def decode_msa(keys):
+    return decode(keys, MSA_WIDTH, MSA_PREFIX)
+
+
+def encode_csa(codes):
+    return encode(codes, CSA_WIDTH)
+
+
+def decode_csa(keys):
+    return decode(keys, CSA_WIDTH, CSA_PREFIX)
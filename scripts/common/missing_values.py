@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+# ===============================
+# Shared missing-value tokenizer
+#
+# Sentinel strings are mapped to one of three tokens column-wise. Each column is factorized first, so the
+# Python-level lookup runs once per distinct value instead of once per row.
+# ===============================
+MISSING = "MISSING"    # no value at all (None / NaN)
+CENSORED = "CENSORED"  # value exists but was withheld or left blank
+UNKNOWN = "UNKNOWN"    # value was recorded as unknown
+TOKENS = (MISSING, CENSORED, UNKNOWN)
+
+# per-dataset sentinel tables: token -> raw strings (matched after strip + lower)
+NAMUS_SENTINELS = {
+    CENSORED: ["", "na", "n/a", "null", "not available"],
+    UNKNOWN: ["unknown", "unk"],
+}
+
+INEGI_SENTINELS = {
+    MISSING: ["", "missing"],
+    CENSORED: ["confidential"],
+    UNKNOWN: ["unknown"],
+}
+
+
+def build_lookup(sentinels):
+    """Flatten a {token: [sentinels]} table into {normalized sentinel: token}."""
+    return {raw.strip().lower(): token for token, raws in sentinels.items() for raw in raws}
+
+
+def tokenize_series(s, sentinels=NAMUS_SENTINELS):
+    """Return `s` with sentinel strings replaced by tokens and None/NaN replaced by MISSING."""
+    lookup = build_lookup(sentinels)
+    codes, uniques = pd.factorize(s)
+
+    # one slot per distinct value, plus a trailing MISSING slot that the -1 code for None/NaN lands on
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    for i, value in enumerate(uniques):
+        mapped[i] = lookup.get(value.strip().lower(), value) if isinstance(value, str) else value
+    mapped[-1] = MISSING
+
+    return pd.Series(mapped[codes], index=s.index, name=s.name)
+
+
+def tokenize_columns(df, columns=None, sentinels=NAMUS_SENTINELS):
+    """Tokenize `columns` of `df` (all columns by default) and return a new DataFrame."""
+    df = df.copy()
+    for col in (df.columns if columns is None else columns):
+        df[col] = tokenize_series(df[col], sentinels)
+    return df
@@ -0,0 +1,75 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# ===============================
+# Shared name-normalization registry
+#
+# Each raw string is interned once per normalizer and its canonical form cached for the rest of the run, so
+# normalizing a column costs one lookup per distinct value (thousands of names) rather than string operations
+# per row (millions). Columns come back categorical - integer codes into the canonical names - and missing
+# values stay missing instead of turning into "NAN".
+# ===============================
+
+
+def _ascii_upper(s):
+    # accents removed, letters and single spaces only
+    s = unicodedata.normalize('NFKD', s).encode('ASCII', 'ignore').decode('utf-8')
+    s = re.sub(r'[^A-Z ]', '', s.upper())
+    return re.sub(r'\s+', ' ', s).strip()
+
+
+NORMALIZERS = {
+    "upper": lambda s: s.strip().upper(),
+    "strip": lambda s: s.strip(),
+    "capitalize": lambda s: s.strip().capitalize(),
+    "ascii_upper": _ascii_upper,
+}
+
+# normalizer -> {raw string: canonical string}
+_interned = {}
+
+
+def register(name, normalizer):
+    """Add a named normalizer (a str -> str function) to the registry."""
+    NORMALIZERS[name] = normalizer
+
+
+def canonical_names(raw, form="upper"):
+    """Canonical form of each raw string in `raw`, computed only for strings not seen before."""
+    normalizer = NORMALIZERS[form] if isinstance(form, str) else form
+    cache = _interned.setdefault(normalizer, {})
+    names = []
+    for value in raw:
+        key = value if isinstance(value, str) else str(value)
+        name = cache.get(key)
+        if name is None:
+            name = cache[key] = normalizer(key)
+        names.append(name)
+    return names
+
+
+def normalize(values, form="upper", categorical=True):
+    """Normalize a Series with a registered normalizer (or any str -> str function).
+
+    Returns a categorical Series aligned with `values`, or an object Series with categorical=False. Raw values
+    that normalize to the same name share one category.
+    """
+    codes, uniques = pd.factorize(values)
+    categories, category_codes = np.unique(np.array(canonical_names(uniques, form), dtype=object), return_inverse=True)
+    # the -1 code of missing values stays -1
+    codes = np.append(category_codes, -1)[codes]
+
+    normalized = pd.Categorical.from_codes(codes, categories=categories)
+    if not categorical:
+        normalized = np.asarray(normalized, dtype=object)
+    return pd.Series(normalized, index=values.index, name=values.name)
+
+
+def share_categories(*columns):
+    """Recode categorical columns onto one set of categories, so merges and comparisons between them work on
+    the integer codes."""
+    categories = pd.Index(pd.unique(np.concatenate([column.cat.categories.to_numpy(object) for column in columns])))
+    return [column.cat.set_categories(categories) for column in columns]
@@ -0,0 +1,118 @@
+import hashlib
+import re
+from pathlib import Path
+
+import pandas as pd
+import geopandas as gpd
+
+# ===============================
+# Shapefile attribute tables
+#
+# Only the attributes are needed (names and FIPS codes), so tables are read from the .dbf alone - no
+# geometries - and reduced right away to the few columns a script uses. Those small tables are pickled under the
+# SHA-256 of their .dbf, so reruns only re-read files that changed. Files that are missing, can't be read or
+# lack the columns are skipped with a message rather than stopping the script.
+# ===============================
+
+
+def file_digest(path):
+    """SHA-256 hex digest of a file, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_attribute_tables(shape_files, cache_path, derive):
+    """{path: derive(attribute table)} for the shapefiles that could be read, in the order given.
+
+    `derive` reduces a full attribute table to the columns needed and raises ValueError when the table doesn't
+    have them. Only its results are cached; the cache is rewritten when a file was (re)read or one cached
+    before is no longer used.
+    """
+    cache = pd.read_pickle(cache_path) if Path(cache_path).exists() else {}
+    used = {}
+    tables = {}
+    for path in shape_files:
+        dbf_path = Path(path).with_suffix('.dbf')
+        try:
+            digest = file_digest(dbf_path)
+            table = cache.get(digest)
+            if table is None:
+                table = derive(pd.DataFrame(gpd.read_file(dbf_path, ignore_geometry=True)))
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"Skipping shapefile {path}: {e}")
+            continue
+        used[digest] = tables[path] = table
+
+    if used.keys() != cache.keys():
+        pd.to_pickle(used, cache_path)
+    return tables
+
+
+def find_column(table, *names):
+    """First column of `table` matching one of `names` (in that order), ignoring decennial suffixes like
+    NAME10; None when there is none."""
+    for name in names:
+        for col in table.columns:
+            if re.sub(r"\d+$", "", col) == name:
+                return col
+    return None
+
+
+def _nhgis_fips(state, county):
+    # NHGIS codes are the FIPS code with a trailing digit: state '280' and county '0130' -> '28013'; a non-zero
+    # trailing digit marks a historical county without a FIPS code of its own, which comes back missing
+    standard = (state.str[-1] == '0') & (county.str[-1] == '0')
+    return (state.str[:2] + county.str[:3]).where(standard)
+
+
+def _digits(codes):
+    # (shortest, longest) code length when every non-missing code is all digits, else None
+    codes = codes.dropna().astype(str)
+    if codes.empty or not codes.str.fullmatch(r"\d+").all():
+        return None
+    lengths = codes.str.len()
+    return lengths.min(), lengths.max()
+
+
+def county_fips(table):
+    """5-digit state + county FIPS string of each row of an attribute table.
+
+    Recognizes GEOID (county or longer subdivision GEOIDs), STATEFP + COUNTYFP, STATE + COUNTY as FIPS
+    (NHGIS 1980 MCDs: STATE80/COUNTY80) or as NHGIS codes (NHGIS county tables: '280' + '0130'),
+    CNTY_FIPS, a 5-digit COUNTY (NHGIS 1990 subdivisions) and GISJOIN; decennial suffixes like STATEFP10
+    are fine. Rows of historical counties without a FIPS code are missing. Raises ValueError when none of
+    the columns is there or their codes have an unexpected width.
+    """
+    # the first column wins when suffixes collide (GISJOIN before GISJOIN2)
+    columns = {}
+    for col in table.columns:
+        columns.setdefault(re.sub(r"\d+$", "", col), col)
+    if "GEOID" in columns:
+        return table[columns["GEOID"]].astype(str).str.zfill(5).str[:5]
+    if "STATEFP" in columns and "COUNTYFP" in columns:
+        return (
+            table[columns["STATEFP"]].astype(str).str.zfill(2)
+            + table[columns["COUNTYFP"]].astype(str).str.zfill(3)
+        )
+    if "STATE" in columns and "COUNTY" in columns:
+        # missing codes stay missing instead of turning into "None"
+        state, county = table[columns["STATE"]].astype("string"), table[columns["COUNTY"]].astype("string")
+        state_digits, county_digits = _digits(state), _digits(county)
+        if state_digits and county_digits and state_digits[1] <= 2 and county_digits[1] <= 3:
+            return (state.str.zfill(2) + county.str.zfill(3)).astype(object)
+        if state_digits == (3, 3) and county_digits == (4, 4):
+            return _nhgis_fips(state, county).astype(object)
+        raise ValueError("STATE/COUNTY codes are neither FIPS (2 + 3 digits) nor NHGIS (3 + 4 digits).")
+    if "CNTY_FIPS" in columns:
+        return table[columns["CNTY_FIPS"]].astype(str).str.zfill(5)
+    if "COUNTY" in columns and _digits(table[columns["COUNTY"]]) == (5, 5):
+        return table[columns["COUNTY"]].astype(str)
+    if "GISJOIN" in columns:
+        # "G" + NHGIS state (3 digits) + NHGIS county (4 digits), then any subdivision code
+        gisjoin = table[columns["GISJOIN"]].astype("string")
+        if gisjoin.notna().any() and gisjoin.dropna().str.fullmatch(r"G\d{7,}").all():
+            return _nhgis_fips(gisjoin.str[1:4], gisjoin.str[4:8]).astype(object)
+    raise ValueError("No recognizable county FIPS columns found.")
@@ -1,7 +1,14 @@
+import sys
+from pathlib import Path
+
 import pandas as pd
 import matplotlib.pyplot as plt
 from datetime import datetime
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.missing_values import INEGI_SENTINELS, tokenize_series
+from common.names import normalize
+
 # Example: df already exists
 df_inegi = pd.read_csv(r'F:\dsl_CLIMA\projects\submittable\missing persons\source\mexico_missing_persons\data.csv', dtype=str)
 
@@ -12,18 +19,14 @@ df_inegi["DATE_OF_INCIDENCE"] = pd.to_datetime(df_inegi["DATE_OF_INCIDENCE"], er
 # -----------------------
 # PIE CHART: SEX
 # -----------------------
-# Normalize SEX values and keep special categories
-df_inegi["SEX_CLEAN"] = (
-    df_inegi["SEX"]
-    .fillna("MISSING")
-    .str.upper()
-)
+# Normalize SEX values and keep special categories (CONFIDENTIAL is tokenized as CENSORED)
+df_inegi["SEX_CLEAN"] = normalize(tokenize_series(df_inegi["SEX"], INEGI_SENTINELS))
 
 # Count values
 sex_counts = df_inegi["SEX_CLEAN"].value_counts()
 
 # Desired order
-desired_order = ["MISSING", "CONFIDENTIAL", "MALE", "FEMALE"]
+desired_order = ["MISSING", "CENSORED", "MALE", "FEMALE"]
 
 # Reindex to enforce order and keep existing categories
 sex_counts = sex_counts.reindex(
@@ -7,21 +7,19 @@ from matplotlib.ticker import LogLocator, FuncFormatter
 import matplotlib.patches as mpatches
 import matplotlib.ticker as mticker
 import missingno as msno
-import unicodedata
-import re
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.missing_values import INEGI_SENTINELS, tokenize_columns
+from common.names import NORMALIZERS, normalize
 
 def normalize_state_name(s):
     if pd.isna(s):
         return s
 
-    # Normalize accents
-    s = unicodedata.normalize('NFKD', s)
-    s = s.encode('ASCII', 'ignore').decode('utf-8')
-    s = s.upper().strip()
-
-    # Remove punctuation and extra spaces
-    s = re.sub(r'[^A-Z ]', '', s)
-    s = re.sub(r'\s+', ' ', s)
+    # Accents, punctuation and extra spaces removed (common/names.py)
+    s = NORMALIZERS['ascii_upper'](s)
 
     # Canonical Mexican state names
     canonical_map = {
@@ -89,29 +87,32 @@ def plot_valid_entries_choropleth_shp(
     if shapefile_path is None:
         raise ValueError("Please provide the path to a .shp file.")
 
+    # special_values are the missing-value tokens (see common/missing_values.py) that count as invalid, on top of
+    # empty cells; pass MISSING to also drop the literal "MISSING" placeholders
     if special_values is None:
-        special_values = ['UNKNOWN', 'CONFIDENTIAL']
+        special_values = ['UNKNOWN', 'CENSORED']
     if columns_to_check is None:
         columns_to_check = [col for col in df.columns if col != state_col]
 
     # Normalize dataframe states
     df = df.copy()
-    df[state_col] = df[state_col].apply(normalize_state_name)
-    df[columns_to_check] = df[columns_to_check].replace(special_values, pd.NA)
+    df[state_col] = normalize(df[state_col], normalize_state_name)
+    empty = df[columns_to_check].isna()
+    df = tokenize_columns(df, columns_to_check, INEGI_SENTINELS)
 
     # Count valid entries per state
+    df['valid'] = (~(df[columns_to_check].isin(special_values) | empty)).sum(axis=1)
     valid_counts = (
-        df.groupby(state_col)[columns_to_check]
-        .apply(lambda g: g.notna().sum().sum())
-        .reset_index()
+        df.groupby(state_col, as_index=False, observed=True)['valid']
+        .sum()
+        .rename(columns={'valid': 'valid_count'})
     )
-    valid_counts.columns = [state_col, 'valid_count']
 
     # Load shapefile
     gdf = gpd.read_file(shapefile_path)
 
     # Normalize shapefile state names
-    gdf[shapefile_state_col] = gdf[shapefile_state_col].apply(normalize_state_name)
+    gdf[shapefile_state_col] = normalize(gdf[shapefile_state_col], normalize_state_name, categorical=False)
 
     # Merge data with shapefile
     merged = gdf.merge(valid_counts, left_on=shapefile_state_col, right_on=state_col, how='left')
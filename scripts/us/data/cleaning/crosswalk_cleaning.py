@@ -1,16 +1,40 @@
+import sys
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 import geopandas as gpd
 
+from place_resolver import build_place_index, place_entries, resolve_places, subdivision_names, MIN_SCORE
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from common.columnar import read_table, write_table
+from common.geokeys import encode_county, encode_csa, encode_msa
+from common.names import normalize, share_categories
+from common.shapefiles import file_digest, load_attribute_tables
+
 # --- Load files ---
-df_population = pd.read_csv(
+# (Parquet copies when present; categoricals decoded since County/State get filled and rewritten below)
+df_population = read_table(
     r'F:\dsl_CLIMA\projects\submittable\missing persons\export\population.csv',
+    categorical=False,
     dtype={'FIPS': str}
 )
-df_namus = pd.read_csv(
-    r'F:\dsl_CLIMA\projects\submittable\missing persons\export\namus_cases.csv'
+df_namus = read_table(
+    r'F:\dsl_CLIMA\projects\submittable\missing persons\export\namus_cases.csv',
+    categorical=False
 )
 crosswalk_file = r'F:\dsl_CLIMA\projects\Missing Persons Project\working_dfs\qcew-county-msa-csa-crosswalk.xlsx'
+crosswalk_cache = r'F:\dsl_CLIMA\projects\Missing Persons Project\working_dfs\qcew-county-msa-csa-crosswalk.pkl'
+subdivision_shape_files = {
+    2023: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\2023\subdivisions\US_cty_sub_2023.shp',
+    2022: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\2022\subdivisons\US_cty_sub_2022.shp',
+    2010: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\2010\subdivisions\US_cty_sub_2010.shp',
+    2000: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\2000\subdivisions\US_cty_sub_2000.shp',
+    1990: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\1990\subdivisions\US_cty_sub_1990.shp',
+    1980: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\1980\subdivisions\US_mcd_1980.shp'
+}
+subdivision_cache = r'F:\dsl_CLIMA\projects\Missing Persons Project\working_dfs\subdivision_names.pkl'
 
 # --- Helper functions ---
 bad_values = {'MISSING', 'UNKNOWN', 'CENSORED'}
@@ -28,131 +52,154 @@ def clean_crosswalk(df_cw):
     
     return df_cw
 
-def merge_pop_with_crosswalk(df_subset, cw, bad_values={'MISSING', 'UNKNOWN', 'CENSORED'}):
-    df = df_subset.copy()
-
-    # --- Normalize columns ---
-    df['County_norm'] = df['County'].astype(str).str.upper().str.strip()
-    df['State_norm'] = df['State'].astype(str).str.upper().str.strip()
-
-    cw['County_norm'] = cw['County Title'].astype(str).str.upper().str.strip()
-    cw['MSA_Title_norm'] = cw['MSA Title'].astype(str).str.upper().str.split(',', n=1).str[0].str.strip()
+# MSA Title state abbreviation -> full state name
+us_state_abbrev = {
+    'AL': 'Alabama','AK': 'Alaska','AZ': 'Arizona','AR': 'Arkansas','CA': 'California',
+    'CO': 'Colorado','CT': 'Connecticut','DE': 'Delaware','FL': 'Florida','GA': 'Georgia',
+    'HI': 'Hawaii','ID': 'Idaho','IL': 'Illinois','IN': 'Indiana','IA': 'Iowa','KS': 'Kansas',
+    'KY': 'Kentucky','LA': 'Louisiana','ME': 'Maine','MD': 'Maryland','MA': 'Massachusetts',
+    'MI': 'Michigan','MN': 'Minnesota','MS': 'Mississippi','MO': 'Missouri','MT': 'Montana',
+    'NE': 'Nebraska','NV': 'Nevada','NH': 'New Hampshire','NJ': 'New Jersey','NM': 'New Mexico',
+    'NY': 'New York','NC': 'North Carolina','ND': 'North Dakota','OH': 'Ohio','OK': 'Oklahoma',
+    'OR': 'Oregon','PA': 'Pennsylvania','RI': 'Rhode Island','SC': 'South Carolina',
+    'SD': 'South Dakota','TN': 'Tennessee','TX': 'Texas','UT': 'Utah','VT': 'Vermont',
+    'VA': 'Virginia','WA': 'Washington','WV': 'West Virginia','WI': 'Wisconsin','WY': 'Wyoming',
+    'D.C.': 'District of Columbia'
+}
+
+def normalize_crosswalk(cw):
+    # join columns for the merges below, derived once per vintage
+    cw['County_norm'] = normalize(cw['County Title'])
+    cw['MSA_Title_norm'] = normalize(cw['MSA Title'].str.split(',', n=1).str[0])
     cw['State_abbr'] = cw['MSA Title'].astype(str).str.extract(r',\s*([^\s]+)', expand=False)
-    
-    # Map abbreviation to full state name if needed
-    us_state_abbrev = {
-        'AL': 'Alabama','AK': 'Alaska','AZ': 'Arizona','AR': 'Arkansas','CA': 'California',
-        'CO': 'Colorado','CT': 'Connecticut','DE': 'Delaware','FL': 'Florida','GA': 'Georgia',
-        'HI': 'Hawaii','ID': 'Idaho','IL': 'Illinois','IN': 'Indiana','IA': 'Iowa','KS': 'Kansas',
-        'KY': 'Kentucky','LA': 'Louisiana','ME': 'Maine','MD': 'Maryland','MA': 'Massachusetts',
-        'MI': 'Michigan','MN': 'Minnesota','MS': 'Mississippi','MO': 'Missouri','MT': 'Montana',
-        'NE': 'Nebraska','NV': 'Nevada','NH': 'New Hampshire','NJ': 'New Jersey','NM': 'New Mexico',
-        'NY': 'New York','NC': 'North Carolina','ND': 'North Dakota','OH': 'Ohio','OK': 'Oklahoma',
-        'OR': 'Oregon','PA': 'Pennsylvania','RI': 'Rhode Island','SC': 'South Carolina',
-        'SD': 'South Dakota','TN': 'Tennessee','TX': 'Texas','UT': 'Utah','VT': 'Vermont',
-        'VA': 'Virginia','WA': 'Washington','WV': 'West Virginia','WI': 'Wisconsin','WY': 'Wyoming',
-        'D.C.': 'District of Columbia'
-    }
     cw['State_full'] = cw['State_abbr'].map(us_state_abbrev)
+    return cw
+
+# --- Crosswalk vintages: parsed and normalized once per version of the workbook ---
+crosswalk_sheets = {
+    2003: 'Dec. 2003 Crosswalk',
+    2013: 'Feb. 2013 Crosswalk',
+    2023: 'Jul. 2023 Crosswalk'
+}
+
+def load_crosswalks(path, cache_path, sheets=crosswalk_sheets):
+    # {vintage: cleaned crosswalk}; reuses the pickled result while the workbook's hash and sheet list match
+    digest = file_digest(path)
+    if Path(cache_path).exists():
+        cached = pd.read_pickle(cache_path)
+        if cached['digest'] == digest and cached['sheets'] == sheets:
+            return cached['crosswalks']
+
+    # one pass over the workbook for all sheets
+    frames = pd.read_excel(path, sheet_name=list(sheets.values()), dtype=str)
+    crosswalks = {
+        vintage: normalize_crosswalk(clean_crosswalk(frames[sheet]))
+        for vintage, sheet in sheets.items()
+    }
+    pd.to_pickle({'digest': digest, 'sheets': sheets, 'crosswalks': crosswalks}, cache_path)
+    return crosswalks
+
+# --- Year-interval crosswalk index ---
+# (County Code, valid_from, valid_to) -> MSA/CSA codes and titles across every vintage; each vintage covers the
+# years up to the next one (the first also covers everything before it, the last everything after). Counties,
+# MSAs and CSAs are joined on integer keys (common/geokeys.py); the code columns are kept for the exports.
+crosswalk_years = {
+    2003: (None, 2003),
+    2013: (2004, 2012),
+    2023: (2013, None)
+}
+crosswalk_columns = ['County Code', 'County Title', 'MSA Code', 'CSA Code', 'MSA Title', 'CSA Title']
+
+def build_crosswalk_index(crosswalks, years=crosswalk_years):
+    first_year, last_year = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+    parts = []
+    for vintage, cw in crosswalks.items():
+        valid_from, valid_to = years[vintage]
+        parts.append(
+            cw[crosswalk_columns]
+            .assign(
+                county_key=encode_county(cw['County Code']),
+                msa_key=encode_msa(cw['MSA Code']),
+                csa_key=encode_csa(cw['CSA Code'])
+            )
+            # one row per county per vintage, so resolving a county-year can never duplicate it
+            .drop_duplicates('county_key')
+            .assign(
+                vintage=vintage,
+                valid_from=first_year if valid_from is None else valid_from,
+                valid_to=last_year if valid_to is None else valid_to
+            )
+        )
+    return pd.concat(parts, ignore_index=True)
+
+def crosswalk_vintage(year, cw_index):
+    # the vintage whose interval holds each year: intervals are contiguous, so this is a binary search on
+    # their start years
+    starts = cw_index.drop_duplicates('vintage').sort_values('valid_from')
+    position = np.searchsorted(starts['valid_from'].to_numpy(), year.to_numpy(), side='right') - 1
+    return starts['vintage'].to_numpy()[position]
+
+def merge_pop_with_crosswalk(df_subset, cw_index, bad_values={'MISSING', 'UNKNOWN', 'CENSORED'}):
+    df = df_subset.copy()
 
     # --- Split good vs bad counties ---
     good_mask = df['County'].notna() & (~df['County'].isin(bad_values))
     df_good = df[good_mask].copy()
 
-    # --- Merge good counties by FIPS ---
+    # --- Merge good counties by (county key, vintage covering the year) in one join ---
+    df_good['county_key'] = encode_county(df_good['FIPS'])
+    df_good['vintage'] = crosswalk_vintage(df_good['Year'], cw_index)
     df_good = df_good.merge(
-        cw[['County Code','County Title','MSA Code','CSA Code','MSA Title','CSA Title']],
-        left_on='FIPS',
-        right_on='County Code',
+        cw_index[crosswalk_columns + ['county_key', 'msa_key', 'csa_key', 'vintage']],
+        on=['county_key', 'vintage'],
         how='left'
-    ).drop(columns=['County Code'], errors='ignore')
+    ).drop(columns=['County Code', 'vintage'], errors='ignore')
 
     return df_good
 
-def merge_cases_with_crosswalk(df_subset, cw, bad_values={'MISSING', 'UNKNOWN', 'CENSORED'}):
-    df = df_subset.copy()
-
-    # --- Normalize columns ---
-    df['County_norm'] = df['County'].astype(str).str.upper().str.strip()
-    df['City_norm'] = df['City'].astype(str).str.upper().str.strip() 
-    df['State_norm'] = df['State'].astype(str).str.upper().str.strip()
-
-    cw['County_norm'] = cw['County Title'].astype(str).str.upper().str.strip()
-    cw['MSA_Title_norm'] = cw['MSA Title'].astype(str).str.upper().str.split(',', n=1).str[0].str.strip()
-    cw['State_abbr'] = cw['MSA Title'].astype(str).str.extract(r',\s*([^\s]+)', expand=False)
-    
-    # Map abbreviation to full state name if needed
-    us_state_abbrev = {
-        'AL': 'Alabama','AK': 'Alaska','AZ': 'Arizona','AR': 'Arkansas','CA': 'California',
-        'CO': 'Colorado','CT': 'Connecticut','DE': 'Delaware','FL': 'Florida','GA': 'Georgia',
-        'HI': 'Hawaii','ID': 'Idaho','IL': 'Illinois','IN': 'Indiana','IA': 'Iowa','KS': 'Kansas',
-        'KY': 'Kentucky','LA': 'Louisiana','ME': 'Maine','MD': 'Maryland','MA': 'Massachusetts',
-        'MI': 'Michigan','MN': 'Minnesota','MS': 'Mississippi','MO': 'Missouri','MT': 'Montana',
-        'NE': 'Nebraska','NV': 'Nevada','NH': 'New Hampshire','NJ': 'New Jersey','NM': 'New Mexico',
-        'NY': 'New York','NC': 'North Carolina','ND': 'North Dakota','OH': 'Ohio','OK': 'Oklahoma',
-        'OR': 'Oregon','PA': 'Pennsylvania','RI': 'Rhode Island','SC': 'South Carolina',
-        'SD': 'South Dakota','TN': 'Tennessee','TX': 'Texas','UT': 'Utah','VT': 'Vermont',
-        'VA': 'Virginia','WA': 'Washington','WV': 'West Virginia','WI': 'Wisconsin','WY': 'Wyoming',
-        'D.C.': 'District of Columbia'
-    }
-    cw['State_full'] = cw['State_abbr'].map(us_state_abbrev)
+case_pop_columns = ['FIPS', 'Year', 'County_pop', 'name', 'source', 'State', 'MSA Code', 'CSA Code', 'MSA Title', 'CSA Title', 'MSA_pop', 'CSA_pop', 'CBSA Type', 'CSA Type']
 
+def merge_cases_with_population(df_cases, df_pop, place_index, bad_values={'MISSING', 'UNKNOWN', 'CENSORED'}, min_score=MIN_SCORE):
     # --- Split good vs bad counties ---
-    good_mask = df['County'].notna() & (~df['County'].isin(bad_values))
-    df_good = df[good_mask].copy()
-    df_bad = df[~good_mask].copy()
+    good_mask = df_cases['County'].notna() & (~df_cases['County'].isin(bad_values))
+    df_good = df_cases[good_mask]
+    df_bad = df_cases[~good_mask].copy()
 
-    # --- Merge good counties by FIPS ---
+    # --- Merge good counties by name ---
     df_good = df_good.merge(
-        cw[['County Code','County Title','MSA Code','CSA Code','MSA Title','CSA Title']],
-        left_on='FIPS',
-        right_on='County Code',
+        df_pop[case_pop_columns + ['County_norm', 'State_norm']],
+        on=['Year', 'County_norm', 'State_norm'],
         how='left'
-    ).drop(columns=['County Code'], errors='ignore')
+    )
 
-    # --- Merge bad counties by City → MSA ---
+    # --- Resolve bad counties by City/State (place_resolver.py), merge by county key ---
+    resolved = resolve_places(place_index, df_bad['City'], df_bad['State'])
+    df_bad['county_key'] = resolved['county_key'].where(resolved['score'] >= min_score)
+    df_bad['City_match_score'] = resolved['score'].where(df_bad['county_key'].notna())
     df_bad = df_bad.merge(
-        cw[['MSA_Title_norm','State_full','MSA Code','CSA Code','MSA Title','CSA Title']],
-        left_on=['City_norm','State_norm'],
-        right_on=['MSA_Title_norm','State_full'],
+        df_pop[case_pop_columns + ['county_key']],
+        on=['Year', 'county_key'],
         how='left'
-    ).drop(columns=['MSA_Title_norm','State_full'], errors='ignore')
-
-    # --- Fill FIPS and County for MSAs with a single county ---
-    msa_single = (
-        cw.groupby('MSA Code', as_index=False)
-        .agg({'County Code':'nunique','County Title':'first'})
-        .query('`County Code` == 1')
-        .rename(columns={'County Title':'Single_County_Title'})
-    )
-    msa_code_fill = cw.groupby('MSA Code', as_index=False).agg({'County Code':'first'})
-    msa_single = msa_single.drop(columns=['County Code']).merge(msa_code_fill, on='MSA Code')
-
-    df_bad = df_bad.merge(msa_single, on='MSA Code', how='left')
-    df_bad['FIPS'] = df_bad['FIPS'].fillna(df_bad['County Code'])
-    df_bad['County'] = df_bad['County'].fillna(df_bad['Single_County_Title'])
-    df_bad.drop(columns=['County Code','Single_County_Title'], inplace=True)
+    ).drop(columns=['county_key'])
+    df_bad['County'] = normalize(df_bad['name'], categorical=False).fillna(df_bad['County'])
 
     # --- Recombine ---
-    df_merged = pd.concat([df_good, df_bad], ignore_index=True)
-    df_merged.drop(columns=['County_norm','City_norm','State_norm'], errors='ignore', inplace=True)
-
-    return df_merged
+    return pd.concat([df_good, df_bad], ignore_index=True).drop_duplicates()
 
 
 def summarize_population_by_msa_all_years(df):
     return (
-        df.groupby(['Year', 'MSA Code'], as_index=False)
+        df.groupby(['Year', 'msa_key'], as_index=False)
           .agg(MSA_pop=('Population', 'sum'))
-          .sort_values(['Year', 'MSA Code'])
+          .sort_values(['Year', 'msa_key'])
           .reset_index(drop=True)
     )
 
 def summarize_population_by_csa_all_years(df):
     return (
-        df.groupby(['Year', 'CSA Code'], as_index=False)
+        df.groupby(['Year', 'csa_key'], as_index=False)
           .agg(CSA_pop=('Population', 'sum'))
-          .sort_values(['Year', 'CSA Code'])
+          .sort_values(['Year', 'csa_key'])
           .reset_index(drop=True)
     )
 
@@ -166,32 +213,26 @@ def simplify_titles(df):
     return df
 
 # --- Normalize for merging ---
-df_namus['County_norm'] = df_namus['County'].str.upper().str.strip()
-df_namus['State_norm'] = df_namus['State'].str.upper().str.strip()
-df_population['County_norm'] = df_population['name'].str.upper().str.strip()
-df_population['State_norm'] = df_population['State'].str.upper().str.strip()
+# (categorical name keys, recoded onto shared categories so the case/population merge compares integer codes)
+df_namus['County_norm'], df_population['County_norm'] = share_categories(
+    normalize(df_namus['County']), normalize(df_population['name'])
+)
+df_namus['State_norm'], df_population['State_norm'] = share_categories(
+    normalize(df_namus['State']), normalize(df_population['State'])
+)
 df_namus['Year'] = df_namus['Year'].astype(int)
 df_population['Year'] = df_population['Year'].astype(int)
 
 # --- Deduplicate population to avoid row multiplication ---
 df_population = df_population.drop_duplicates(subset=['Year', 'State_norm', 'County_norm'])
 
-# --- Load and clean crosswalks ---
-cw_2003 = clean_crosswalk(pd.read_excel(crosswalk_file, sheet_name='Dec. 2003 Crosswalk', dtype=str))
-cw_2013 = clean_crosswalk(pd.read_excel(crosswalk_file, sheet_name='Feb. 2013 Crosswalk', dtype=str))
-cw_2023 = clean_crosswalk(pd.read_excel(crosswalk_file, sheet_name='Jul. 2023 Crosswalk', dtype=str))
+# --- Load cleaned crosswalks (cached) and index them by year interval ---
+crosswalks = load_crosswalks(crosswalk_file, crosswalk_cache)
+cw_index = build_crosswalk_index(crosswalks)
 
-# --- Split Population by year ---
+# --- Attach MSA/CSA to every population county-year ---
 df_population['County'] = df_population['name'].copy()
-df_pop_2003 = df_population[df_population['Year'] <= 2003]
-df_pop_2013 = df_population[(df_population['Year'] > 2003) & (df_population['Year'] < 2013)]
-df_pop_2023 = df_population[df_population['Year'] >= 2013]
-
-df_pop_final = pd.concat([
-    merge_pop_with_crosswalk(df_pop_2003, cw_2003),
-    merge_pop_with_crosswalk(df_pop_2013, cw_2013),
-    merge_pop_with_crosswalk(df_pop_2023, cw_2023)
-], ignore_index=True)
+df_pop_final = merge_pop_with_crosswalk(df_population, cw_index)
 
 df_cbsa = summarize_population_by_msa_all_years(df_pop_final)
 df_csa = summarize_population_by_csa_all_years(df_pop_final)
@@ -199,21 +240,22 @@ df_csa = summarize_population_by_csa_all_years(df_pop_final)
 # --- Summarize populations ---
 df_pop_final = (
     df_pop_final
-    .merge(df_cbsa, on=['Year', 'MSA Code'], how='left')
-    .merge(df_csa, on=['Year', 'CSA Code'], how='left')
+    .merge(df_cbsa, on=['Year', 'msa_key'], how='left')
+    .merge(df_csa, on=['Year', 'csa_key'], how='left')
     .rename(columns={'Population': 'County_pop'})
 ).copy()
 
 df_pop_final = simplify_titles(df_pop_final)
 
-# --- Merge population ---
-df_namus = df_namus.merge(
-    df_pop_final[['FIPS', 'Year', 'County_pop', 'name', 'source', 'State', 'MSA Code', 'CSA Code', 'MSA Title', 'CSA Title', 'MSA_pop', 'CSA_pop', 'CBSA Type', 'CSA Type', 'County_norm', 'State_norm']],
-    on=['Year', 'County_norm', 'State_norm'],
-    how='left'
-).drop_duplicates()
+# --- Merge population (cases without a usable county are placed by City/State) ---
+place_index = build_place_index(place_entries(
+    crosswalks[max(crosswalks)],
+    load_attribute_tables(subdivision_shape_files.values(), subdivision_cache, subdivision_names),
+    us_state_abbrev
+))
+df_namus = merge_cases_with_population(df_namus, df_pop_final, place_index)
 
-df_namus = df_namus[['CaseID','CurrentMinAge','CurrentMaxAge','Sex','Ethnicity','DisappearanceDate','City','State_x','County','Year','FIPS','County_pop','MSA Code','CSA Code','MSA Title','CSA Title','MSA_pop','CSA_pop','CBSA Type','CSA Type']]
+df_namus = df_namus[['CaseID','CurrentMinAge','CurrentMaxAge','Sex','Ethnicity','DisappearanceDate','City','State_x','County','Year','FIPS','County_pop','MSA Code','CSA Code','MSA Title','CSA Title','MSA_pop','CSA_pop','CBSA Type','CSA Type','City_match_score']]
 df_namus = df_namus.rename(columns={'State_x': 'State'})
 # --- Filter years and drop territories ---
 # df_namus = df_namus[(df_namus['Year'] > 1999) & (df_namus['Year'] < 2025)]
@@ -222,10 +264,14 @@ df_namus = df_namus.rename(columns={'State_x': 'State'})
 df_namus = df_namus[df_namus['FIPS'].notna()].copy()
 
 # --- Export ---
-df_namus.to_csv(r'F:\dsl_CLIMA\projects\submittable\missing persons\export\mp_term.csv', index=False)
+write_table(df_namus, r'F:\dsl_CLIMA\projects\submittable\missing persons\export\mp_term.csv')
 
-df_pop_final = df_pop_final[['FIPS', 'Year', 'County_pop', 'name', 'source', 'State', 'MSA Code', 'CSA Code', 'MSA Title', 'CSA Title', 'MSA_pop', 'CSA_pop', 'CBSA Type', 'CSA Type']]
-df_pop_final.to_csv(r'F:\dsl_CLIMA\projects\submittable\missing persons\export\pop_term.csv', index=False)
+df_pop_final = df_pop_final[case_pop_columns]
+write_table(
+    df_pop_final,
+    r'F:\dsl_CLIMA\projects\submittable\missing persons\export\pop_term.csv',
+    categoricals=('State', 'name', 'source', 'CBSA Type', 'CSA Type')
+)
 
 print("Final row count:", len(df_namus))
 print(df_namus.isna().sum())
\ No newline at end of file
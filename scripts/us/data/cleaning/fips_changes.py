@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from common.geokeys import encode_county
+
+# ===============================
+# County FIPS harmonization table
+#
+# One row per (FIPS, years) rule: a record coded `fips` in a year within [valid_from, valid_to] belongs to the
+# geography `harmonized_fips`, and `name` (when set) is the name NamUs uses for it. valid_to of None means the
+# rule is still in effect. Sources: SEER county attribute changes and Dorn's FIPS county code changes (see
+# README). Only one-to-one changes can be harmonized this way; splits like Broomfield, CO (2001) and the
+# Connecticut planning regions (2022) aren't in here - the planning regions are separate geographies from 2023.
+# ===============================
+OPEN_ENDED = 9999
+
+FIPS_CHANGES = pd.DataFrame.from_records([
+    # fips,  valid_from, valid_to, harmonized_fips, name
+    # --- recodes / absorbed independent cities ---
+    ('12025', 1969, 1997, '12086', 'Miami-Dade County'),  # Dade County recoded as Miami-Dade, 1997
+    ('51123', 1969, 1974, '51800', None),                   # Nansemond County -> Suffolk city, 1974
+    ('51780', 1969, 1995, '51083', None),                   # South Boston city -> Halifax County, 1995
+    ('51560', 1969, 2001, '51005', None),                   # Clifton Forge city -> Alleghany County, 2001
+    ('51515', 1969, 2013, '51019', None),                   # Bedford city -> Bedford County, 2013
+    ('46113', 1969, 2015, '46102', 'Oglala Lakota County'), # Shannon County renamed Oglala Lakota, 2015
+    ('02270', 1969, 2015, '02158', 'Kusilvak Census Area'), # Wade Hampton renamed Kusilvak, 2015
+
+    # --- names as NamUs spells them ---
+    ('12086', 1969, None, '12086', 'Miami-Dade County'),
+    ('17099', 1969, None, '17099', 'Lasalle County'),
+    ('35011', 1969, None, '35011', 'De Baca County'),
+    ('22095', 1969, None, '22095', 'St. John the Baptist Parish'),
+    ('35013', 1969, None, '35013', 'DOÑA ANA COUNTY'),
+    ('46102', 1969, None, '46102', 'Oglala Lakota County'),
+    ('02158', 1969, None, '02158', 'Kusilvak Census Area'),
+], columns=['fips', 'valid_from', 'valid_to', 'harmonized_fips', 'name'])
+
+FIPS_CHANGES['valid_to'] = FIPS_CHANGES['valid_to'].fillna(OPEN_ENDED).astype(int)
+# joined on integer county keys (common/geokeys.py)
+FIPS_CHANGES['fips'] = encode_county(FIPS_CHANGES['fips'])
+FIPS_CHANGES['harmonized_fips'] = encode_county(FIPS_CHANGES['harmonized_fips'])
+
+
+def harmonize_fips(fips, year=None, table=FIPS_CHANGES):
+    """Return a DataFrame of harmonized county key and NamUs name for each (key, year), aligned with `fips`.
+
+    FIPS without a matching rule come back unchanged, with a null name. With year=None every rule for a FIPS
+    matches regardless of its years (for undated tables), and the one listed last wins.
+    """
+    keys = pd.DataFrame({'fips': fips.array, 'row': np.arange(len(fips))})
+    if year is not None:
+        keys['year'] = year.to_numpy()
+
+    matched = keys.merge(table, on='fips', how='inner')
+    if year is not None:
+        matched = matched[(matched['year'] >= matched['valid_from']) & (matched['year'] <= matched['valid_to'])]
+    matched = matched.drop_duplicates('row', keep='last').set_index('row').reindex(keys['row'])
+
+    return pd.DataFrame({
+        'FIPS': matched['harmonized_fips'].fillna(keys['fips']).array,
+        'name': matched['name'].to_numpy(),
+    }, index=fips.index)
@@ -1,170 +1,144 @@
-import pandas as pd
-import numpy as np
-import csv
-import json
-
-# ===============================
-# Helper: tokenize missing values
-# ===============================
-def tokenize(value):
-    """Convert empty/missing/unknown/redacted values into consistent tokens."""
-    if value is None:
-        return "MISSING"
-    if isinstance(value, str):
-        stripped = value.strip().lower()
-        if stripped in ["", "na", "n/a", "null", "not available"]:
-            return "CENSORED"
-        if stripped in ["unknown", "unk"]:
-            return "UNKNOWN"
-    return value
+import os
+import sys
+from pathlib import Path
 
+import pandas as pd
 
-# ===============================
-# Load raw NamUs JSON
-# ===============================
-with open(
-    r'F:\dsl_CLIMA\projects\Missing Persons Project\output\namus-20250717.json',
-    'r',
-    encoding='utf-8'
-) as f:
-    data = json.load(f)
-
-main_data = []
-
-for entry in data:
-    subject = entry.get("subjectIdentification", {})
-    desc = entry.get("subjectDescription", {})
-    physical = entry.get("physicalDescription", {})
-    sighting = entry.get("sighting", {})
-    agency = entry.get("primaryInvestigatingAgency", {})
-
-    row = {
-        "CaseID": tokenize(entry.get("idFormatted")),
-        "CurrentMinAge": tokenize(subject.get("currentMinAge")),
-        "CurrentMaxAge": tokenize(subject.get("currentMaxAge")),
-        "Sex": tokenize(desc.get("sex", {}).get("name") if desc.get("sex") else None),
-        "Ethnicity": tokenize(desc.get("primaryEthnicity", {}).get("name") if desc.get("primaryEthnicity") else None),
-        "DisappearanceDate": tokenize(sighting.get("date")),
-        "City": tokenize(sighting.get("address", {}).get("city") if sighting.get("address") else None),
-        "State": tokenize(
-            sighting.get("address", {})
-            .get("state", {})
-            .get("name") if sighting.get("address") else None
-        ),
-        "County": tokenize(
-            sighting.get("address", {})
-            .get("county", {})
-            .get("name") if sighting.get("address") else None
-        ),
-        "InvestigatingAgency": tokenize(agency.get("name")),
+from namus_ingest import COLUMNS, field_types, flatten_snapshot
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from common.columnar import write_table
+from common.missing_values import NAMUS_SENTINELS, tokenize_columns
+from common.names import normalize
+
+# ===============================
+# Flatten raw NamUs JSON into columns
+# (split across processes; set to 1 to stream it in this process instead)
+# ===============================
+FLATTEN_WORKERS = os.cpu_count()
+
+
+# everything below runs only when the script is run directly: the flattening workers re-import this module
+# where processes are spawned (Windows), and must not run it again
+def main():
+    columns = flatten_snapshot(
+        r'F:\dsl_CLIMA\projects\Missing Persons Project\output\namus-20250717.json',
+        workers=FLATTEN_WORKERS
+    )
+
+
+    # ===============================
+    # Build typed DataFrame
+    # (missing values tokenized column-wise; ages numeric, dates parsed in one vectorized pass, so tokens like
+    # MISSING become NaN/NaT there)
+    # ===============================
+    df_namus = tokenize_columns(pd.DataFrame(columns, columns=COLUMNS), sentinels=NAMUS_SENTINELS)
+    del columns
+
+    # dtypes come from the schema in namus_ingest.py
+    for col, dtype in field_types().items():
+        if dtype == 'datetime':
+            df_namus[col] = pd.to_datetime(df_namus[col], errors='coerce', format='ISO8601')
+        else:
+            df_namus[col] = pd.to_numeric(df_namus[col], errors='coerce').astype(dtype)
+
+
+    # ===============================
+    # Optional debug artifact: flattened cases before filtering
+    # ===============================
+    WRITE_DEBUG_CSV = False
+
+    if WRITE_DEBUG_CSV:
+        df_namus.to_csv(
+            r'F:\dsl_CLIMA\projects\submittable\missing persons\export\cleaned_missing_persons.csv',
+            index=False
+        )
+
+    df_namus = df_namus[
+        ["CaseID", "CurrentMinAge", "CurrentMaxAge", "Sex", "Ethnicity",
+         "DisappearanceDate", "City", "State", "County"]
+    ].copy()
+
+
+    # ===============================
+    # Year handling (cap pre-1969)
+    # ===============================
+    df_namus['Year'] = df_namus['DisappearanceDate'].dt.year
+    df_namus.loc[df_namus['Year'] < 1969, 'Year'] = 1969
+    df_namus.loc[df_namus['Year'] > 2024, 'Year'] = 2024
+    df_namus['Year'] = df_namus['Year'].astype(int)
+
+
+    # ===============================
+    # Connecticut post-2022 handling
+    # ===============================
+    connecticut_cities_to_county = {
+        'EAST HARTFORD': 'CAPITOL PLANNING REGION',
+        'MERIDEN': 'SOUTH CENTRAL CONNECTICUT PLANNING REGION',
+        'NEW BRITAIN': 'CAPITOL PLANNING REGION',
+        'TORRINGTON': 'NORTHWEST HILLS PLANNING REGION',
+        'WEST HARTFORD': 'CAPITOL PLANNING REGION',
+        'GLASTONBURY': 'CAPITOL PLANNING REGION',
+        'DERBY': 'NAUGATUCK VALLEY PLANNING REGION',
+        'LISBON': 'SOUTHEASTERN CONNECTICUT PLANNING REGION',
+        'AVON': 'CAPITOL PLANNING REGION',
+        'GUILFORD': 'SOUTH CENTRAL CONNECTICUT PLANNING REGION',
+        'HAMDEN': 'SOUTH CENTRAL CONNECTICUT PLANNING REGION',
+        'GROTON': 'SOUTHEASTERN CONNECTICUT PLANNING REGION',
+        'BRIDGEPORT': 'GREATER BRIDGEPORT PLANNING REGION',
+        'NEW HAVEN': 'SOUTH CENTRAL CONNECTICUT PLANNING REGION',
+        'HARTFORD': 'CAPITOL PLANNING REGION',
+        'LEDYARD': 'SOUTHEASTERN CONNECTICUT PLANNING REGION',
+        'DANBURY': 'SOUTHEASTERN CONNECTICUT PLANNING REGION'
     }
 
-    main_data.append(row)
-
-
-# ===============================
-# Write intermediate CSV
-# ===============================
-output_csv = r'F:\dsl_CLIMA\projects\submittable\missing persons\export\cleaned_missing_persons.csv'
-
-with open(output_csv, 'w', newline='', encoding='utf-8') as f:
-    writer = csv.DictWriter(f, fieldnames=main_data[0].keys())
-    writer.writeheader()
-    writer.writerows(main_data)
-
-
-# ===============================
-# Reload as DataFrame
-# ===============================
-df_namus = pd.read_csv(
-    output_csv,
-    parse_dates=['DisappearanceDate'],
-    date_parser=lambda x: pd.to_datetime(x, errors='coerce')
-)
+    # Normalize early (categorical; see common/names.py)
+    df_namus['State'] = normalize(df_namus['State'])
+    df_namus['County'] = normalize(df_namus['County'])
+    df_namus['City'] = normalize(df_namus['City'])
 
-df_namus = df_namus[
-    ["CaseID", "CurrentMinAge", "CurrentMaxAge", "Sex", "Ethnicity",
-     "DisappearanceDate", "City", "State", "County"]
-].copy()
+    planning_regions = set(connecticut_cities_to_county.values()) - set(df_namus['County'].cat.categories)
+    df_namus['County'] = df_namus['County'].cat.add_categories(sorted(planning_regions))
 
+    ct_mask = (df_namus['State'] == 'CONNECTICUT') & (df_namus['Year'] > 2022)
+    mapped_ct = df_namus.loc[ct_mask, 'City'].map(connecticut_cities_to_county)
+    df_namus.loc[ct_mask, 'County'] = mapped_ct.combine_first(df_namus.loc[ct_mask, 'County'])
 
-# ===============================
-# Year handling (cap pre-1969)
-# ===============================
-df_namus['Year'] = df_namus['DisappearanceDate'].dt.year
-df_namus.loc[df_namus['Year'] < 1969, 'Year'] = 1969
-df_namus.loc[df_namus['Year'] > 2024, 'Year'] = 2024
-df_namus['Year'] = df_namus['Year'].astype(int)
 
+    # ===============================
+    # Drop territories
+    # 
+    # ===============================
+    dropped_states = {
+        'PUERTO RICO',
+        'VIRGIN ISLANDS',
+        'GUAM',
+        'NORTHERN MARIANA ISLANDS'
+    }
+    df_namus = df_namus[~df_namus['State'].isin(dropped_states)]
 
-# ===============================
-# Connecticut post-2022 handling
-# ===============================
-connecticut_cities_to_county = {
-    'EAST HARTFORD': 'CAPITOL PLANNING REGION',
-    'MERIDEN': 'SOUTH CENTRAL CONNECTICUT PLANNING REGION',
-    'NEW BRITAIN': 'CAPITOL PLANNING REGION',
-    'TORRINGTON': 'NORTHWEST HILLS PLANNING REGION',
-    'WEST HARTFORD': 'CAPITOL PLANNING REGION',
-    'GLASTONBURY': 'CAPITOL PLANNING REGION',
-    'DERBY': 'NAUGATUCK VALLEY PLANNING REGION',
-    'LISBON': 'SOUTHEASTERN CONNECTICUT PLANNING REGION',
-    'AVON': 'CAPITOL PLANNING REGION',
-    'GUILFORD': 'SOUTH CENTRAL CONNECTICUT PLANNING REGION',
-    'HAMDEN': 'SOUTH CENTRAL CONNECTICUT PLANNING REGION',
-    'GROTON': 'SOUTHEASTERN CONNECTICUT PLANNING REGION',
-    'BRIDGEPORT': 'GREATER BRIDGEPORT PLANNING REGION',
-    'NEW HAVEN': 'SOUTH CENTRAL CONNECTICUT PLANNING REGION',
-    'HARTFORD': 'CAPITOL PLANNING REGION',
-    'LEDYARD': 'SOUTHEASTERN CONNECTICUT PLANNING REGION',
-    'DANBURY': 'SOUTHEASTERN CONNECTICUT PLANNING REGION'
-}
-
-# Normalize early
-df_namus['State'] = df_namus['State'].astype(str).str.strip().str.upper()
-df_namus['County'] = df_namus['County'].astype(str).str.strip().str.upper()
-df_namus['City'] = df_namus['City'].astype(str).str.strip().str.upper()
-
-ct_mask = (df_namus['State'] == 'CONNECTICUT') & (df_namus['Year'] > 2022)
-mapped_ct = df_namus.loc[ct_mask, 'City'].map(connecticut_cities_to_county)
-df_namus.loc[ct_mask, 'County'] = mapped_ct.combine_first(df_namus.loc[ct_mask, 'County'])
-
+    # ===============================
+    # Bad county flag
+    # ===============================
+    bad_values = {'MISSING', 'UNKNOWN', 'CENSORED'}
 
-# ===============================
-# Drop territories
-# 
-# ===============================
-dropped_states = {
-    'PUERTO RICO',
-    'VIRGIN ISLANDS',
-    'GUAM',
-    'NORTHERN MARIANA ISLANDS'
-}
-df_namus = df_namus[~df_namus['State'].isin(dropped_states)]
+    # cases without a usable county are kept when they have a city - crosswalk_cleaning.py places them by
+    # City/State (place_resolver.py); cases with neither are dropped
+    has_county = df_namus['County'].notna() & (~df_namus['County'].isin(bad_values))
+    has_city = ~df_namus['City'].isin(bad_values)
 
-# ===============================
-# Bad county flag
-# ===============================
-bad_values = {'MISSING', 'UNKNOWN', 'CENSORED'}
+    df_namus = df_namus[has_county | has_city].copy()
 
-df_namus['County'] = (
-    df_namus['County']
-        .astype(str)
-        .str.strip()
-        .replace({'NAN': np.nan})
-)
 
-df_namus = df_namus[
-    df_namus['County'].notna() &
-    (~df_namus['County'].isin(bad_values))
-].copy()
+    # ===============================
+    # Export final NamUs cases (CSV + typed Parquet copy)
+    # Total Cases: 25532 (before cases placed by City/State were kept)
+    # ===============================
+    write_table(df_namus, r'F:\dsl_CLIMA\projects\submittable\missing persons\export\namus_cases.csv')
 
+    print("Final row count:", len(df_namus))
+    print(df_namus)
 
-# ===============================
-# Export final NamUs cases
-# Total Cases: 25532
-# ===============================
-df_namus.to_csv( r'F:\dsl_CLIMA\projects\submittable\missing persons\export\namus_cases.csv', index=False)
 
-print("Final row count:", len(df_namus))
-print(df_namus)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# ===============================
+# Streaming NamUs snapshot ingest
+#
+# The snapshot is a JSON array with one case per line (see scraper/namus.py save_cases), but anything that is
+# a JSON array - or bare concatenated objects - works. Cases are decoded one at a time and flattened straight
+# into per-column lists, so the nested JSON for the whole file is never held in memory at once.
+# ===============================
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_array(f, chunk_size=1 << 20):
+    """Yield the elements of a JSON array from an open text file, one at a time."""
+    buf = ""
+    pos = 0
+    eof = False
+    opened = False
+    while True:
+        # skip whitespace (and the commas between elements, once inside the array)
+        while pos < len(buf) and (buf[pos] in _WHITESPACE or (opened and buf[pos] == ",")):
+            pos += 1
+
+        if pos < len(buf):
+            if not opened:
+                # bare concatenated objects (jsonlines) are accepted too
+                opened = True
+                if buf[pos] == "[":
+                    pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+
+            try:
+                obj, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # element runs past the end of the buffer - read more and try again
+            else:
+                # an element ending exactly at the buffer edge might be a truncated number, so only trust it
+                # once more input (or EOF) follows
+                if end < len(buf) or eof:
+                    yield obj
+                    pos = end
+                    continue
+        elif eof:
+            return
+
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def iter_cases(path, chunk_size=1 << 20):
+    """Yield NamUs cases one at a time from a snapshot file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from iter_json_array(f, chunk_size)
+
+
+# ===============================
+# Field-extraction schema
+#
+# output column -> dotted JSON path, optionally paired with the dtype namus_cleaning.py casts it to. A path
+# segment ending in [] walks a list and joins the values found under it with "; ". Adding a column is one
+# line here; nulls anywhere along a path give None.
+# ===============================
+SCHEMA = {
+    "CaseID": "idFormatted",
+    "CurrentMinAge": ("subjectIdentification.currentMinAge", "Int64"),
+    "CurrentMaxAge": ("subjectIdentification.currentMaxAge", "Int64"),
+    "Sex": "subjectDescription.sex.name",
+    "Ethnicity": "subjectDescription.primaryEthnicity.name",
+    "DisappearanceDate": ("sighting.date", "datetime"),
+    "City": "sighting.address.city",
+    "State": "sighting.address.state.name",
+    "County": "sighting.address.county.name",
+    "InvestigatingAgency": "primaryInvestigatingAgency.name",
+}
+
+LIST_SEPARATOR = "; "
+
+
+def field_path(spec):
+    return spec[0] if isinstance(spec, tuple) else spec
+
+
+def field_types(schema=SCHEMA):
+    """{column: dtype} for the columns that declare one."""
+    return {column: spec[1] for column, spec in schema.items() if isinstance(spec, tuple)}
+
+
+def _get_path(value, keys):
+    for key in keys:
+        if value.__class__ is not dict:
+            return None
+        value = value.get(key)
+    return value
+
+
+def _join_list(items, keys):
+    if items.__class__ is not list:
+        return None
+    values = [_get_path(item, keys) for item in items]
+    values = [str(value) for value in values if value is not None]
+    return LIST_SEPARATOR.join(values) if values else None
+
+
+def compile_schema(schema=SCHEMA):
+    """Compile the schema into one function returning a tuple of values in schema order.
+
+    The function is generated as source so every shared path prefix (e.g. sighting.address) is looked up
+    only once per case, and there is no per-field interpretation of the schema at run time. Most cases have
+    every nested object present, so the lookups run unguarded first and only fall back to the null-checked
+    version when one of them hits a null.
+    """
+    fast = []
+    safe = []
+    prefixes = {(): "entry"}
+
+    def lookup(keys):
+        # emit one variable per distinct path prefix, reusing any that already exist
+        if keys not in prefixes:
+            parent = lookup(keys[:-1])
+            name = f"v{len(prefixes)}"
+            fast.append(f"{name} = {parent}.get({keys[-1]!r})")
+            # nested objects are either a dict or null in NamUs payloads
+            safe.append(f"{name} = {parent}.get({keys[-1]!r}) if {parent} else None")
+            prefixes[keys] = name
+        return prefixes[keys]
+
+    outputs = []
+    for column, spec in schema.items():
+        head, is_list, tail = field_path(spec).partition("[]")
+        keys = tuple(head.split("."))
+        if is_list:
+            rest = tuple(key for key in tail.split(".") if key)
+            outputs.append(f"_join_list({lookup(keys)}, {rest!r})")
+        else:
+            outputs.append(lookup(keys))
+
+    source = "\n".join(
+        ["def extract(entry):", "    try:"]
+        + [f"        {line}" for line in fast]
+        + ["    except AttributeError:"]
+        + [f"        {line}" for line in safe]
+        + [f"    return ({', '.join(outputs)},)", ""]
+    )
+    namespace = {"_join_list": _join_list}
+    exec(source, namespace)
+    extract = namespace["extract"]
+    extract.source = source
+    return extract
+
+
+# ===============================
+# Flatten cases into columns
+# ===============================
+COLUMNS = list(SCHEMA)
+flatten_case = compile_schema(SCHEMA)
+
+
+def flatten_cases(cases):
+    """Flatten an iterable of cases into {column: list of values}."""
+    columns = {name: [] for name in COLUMNS}
+    appenders = [columns[name].append for name in COLUMNS]
+    for entry in cases:
+        for append, value in zip(appenders, flatten_case(entry)):
+            append(value)
+    return columns
+
+
+# ===============================
+# Parallel flattening of line-oriented snapshots
+#
+# The snapshot is split into byte ranges that start and end on line boundaries; each range is flattened in
+# its own process and the column lists are concatenated back in file order.
+# ===============================
+def line_ranges(path, n_chunks):
+    """Split a file into up to n_chunks (start, end) byte ranges that begin at the start of a line."""
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, n_chunks):
+            f.seek(size * i // n_chunks)
+            f.readline()  # move to the start of the next line
+            if f.tell() > boundaries[-1]:
+                boundaries.append(f.tell())
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def flatten_range(path, start, end):
+    """Flatten the cases on the lines within [start, end) of a one-case-per-line snapshot."""
+    columns = {name: [] for name in COLUMNS}
+    appenders = [columns[name].append for name in COLUMNS]
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+
+            line = line.strip().rstrip(b',')
+            if not line or line in (b'[', b']'):
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(
+                    f"{path} is not in the one-case-per-line format needed for parallel flattening "
+                    f"(byte {pos - len(line)}); use workers=1"
+                ) from e
+
+            for append, value in zip(appenders, flatten_case(entry)):
+                append(value)
+    return columns
+
+
+def flatten_snapshot(path, workers=None, chunks_per_worker=4):
+    """Flatten a snapshot into {column: list of values}, across `workers` processes when possible.
+
+    Workers run flatten_range on (path, start, end) arguments, so they work with spawned processes (Windows)
+    as well as forked ones; a script calling this with workers > 1 needs an `if __name__ == '__main__'` guard.
+    If the process pool can't be started, this says so and falls back to the single-process streaming path.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        return flatten_cases(iter_cases(path))
+
+    # a few chunks per worker so one slow chunk doesn't leave the other cores idle at the end
+    ranges = line_ranges(path, workers * chunks_per_worker)
+    columns = {name: [] for name in COLUMNS}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() hands results back in submission order, which keeps rows in file order
+            for part in pool.map(flatten_range, *zip(*[(path, start, end) for start, end in ranges])):
+                for name in COLUMNS:
+                    columns[name].extend(part[name])
+    except (OSError, BrokenProcessPool) as e:
+        print(f"Parallel flattening failed ({e!r}); flattening {path} in one process")
+        return flatten_cases(iter_cases(path))
+    return columns
@@ -0,0 +1,290 @@
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fips_changes import harmonize_fips
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from common.geokeys import county_state, encode_county, encode_msa
+from common.names import normalize
+from common.shapefiles import county_fips, find_column
+
+# ===============================
+# City/state -> county resolution for cases without a usable county
+#
+# Place names come from the crosswalk (independent cities, MSA principal cities) and the county subdivision
+# shapefile attributes (towns, townships, MCDs), normalized once into a per-state index:
+#   - exact lookups on the normalized name (dict)
+#   - fuzzy lookups on character trigrams, through an inverted index of trigram -> entry ids, so a query only
+#     scores the entries it shares a trigram with - never every place in the state
+# Every distinct (city, state) pair is resolved once, however many cases carry it.
+# ===============================
+MIN_SCORE = 0.8
+
+# abbreviations spelled out, and legal descriptors dropped from the end of a name
+_ABBREVIATIONS = {"ST": "SAINT", "STE": "SAINTE", "FT": "FORT", "MT": "MOUNT"}
+_DESCRIPTORS = {"TOWNSHIP", "TWP", "VILLAGE", "BOROUGH", "CITY", "CDP", "CHARTER", "DIVISION", "CCD"}
+_NON_ALNUM = re.compile(r"[^A-Z0-9 ]+")
+
+# principal cities of an MSA title: "Birmingham-Hoover, AL MSA", "New York-Newark-Jersey City, NY-NJ-PA MSA"
+_MSA_TITLE = re.compile(r"^(?P<cities>[^,]+),\s*(?P<states>[A-Z]{2}(?:-[A-Z]{2})*)")
+
+
+def _normalize(name):
+    tokens = _NON_ALNUM.sub(" ", str(name).upper().replace("&", " AND ").replace(".", "").replace("'", "")).split()
+    tokens = [_ABBREVIATIONS.get(token, token) for token in tokens]
+    while len(tokens) > 1 and tokens[-1] in _DESCRIPTORS:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def normalize_place(names):
+    """Normalized place names for a Series, through the shared name registry; missing names stay NaN."""
+    return normalize(names, _normalize, categorical=False)
+
+
+def trigrams(place):
+    # per token, padded like pg_trgm ("  SAINT " -> "  S", " SA", "SAI", ...) so word starts weigh in
+    grams = set()
+    for token in place.split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+# ===============================
+# Place entries: one row per (state, normalized place, county key, MSA key)
+# ===============================
+ENTRY_COLUMNS = ["state", "place", "county_key", "msa_key", "kind"]
+
+
+def crosswalk_counties(cw):
+    """County key, MSA key, county title, upper-case state name and (for single-state MSAs) the state
+    abbreviation of each county in a crosswalk vintage."""
+    title = cw["County Title"].astype(str).str.split(",", n=1)
+    counties = pd.DataFrame({
+        "county_key": encode_county(cw["County Code"]),
+        "msa_key": encode_msa(cw["MSA Code"]),
+        "title": title.str[0].str.strip(),
+        "state": normalize(title.str[1], categorical=False),
+        "abbr": cw["MSA Title"].astype(str).str.extract(r",\s*([A-Z]{2})\s", expand=False),
+    })
+    return counties.dropna(subset=["county_key", "state"])
+
+
+def crosswalk_places(cw, state_abbrev=None):
+    """Place entries from one crosswalk vintage: independent cities and MSA principal cities.
+
+    state_abbrev ({abbreviation: state name}) places the cities of multi-state MSAs; without it, abbreviations
+    are only known from single-state MSA titles.
+    """
+    counties = crosswalk_counties(cw)
+
+    # the descriptor's case differs between vintages ("Richmond city" in 2003, "Richmond City" in 2023)
+    independent = counties[counties["title"].str.lower().str.endswith(" city")]
+    cities = independent.assign(place=independent["title"].str[:-len(" city")], kind="independent city")
+
+    # each principal city goes in each state where its MSA has counties; its county is known only where the MSA
+    # has a single county in that state
+    state_by_abbr = counties.dropna(subset=["abbr"]).groupby("abbr")["state"].agg(lambda s: s.mode().iloc[0])
+    state_by_abbr = {**state_by_abbr, **{abbr: name.upper() for abbr, name in (state_abbrev or {}).items()}}
+    msa = cw["MSA Title"].astype(str).str.extract(_MSA_TITLE).assign(msa_key=encode_msa(cw["MSA Code"]))
+    msa = msa.dropna(subset=["cities", "msa_key"]).drop_duplicates("msa_key")
+    principal = (
+        msa.assign(place=msa["cities"].str.split("-"), abbr=msa["states"].str.split("-"))
+        .explode("place").explode("abbr")
+    )
+    principal["state"] = principal["abbr"].map(state_by_abbr)
+
+    per_state = counties.groupby(["msa_key", "state"])["county_key"].agg(["nunique", "first"]).reset_index()
+    per_state["county_key"] = per_state["first"].where(per_state["nunique"] == 1)
+    principal = principal.merge(per_state[["msa_key", "state", "county_key"]], on=["msa_key", "state"])
+    principal["kind"] = "principal city"
+
+    entries = pd.concat([cities[ENTRY_COLUMNS], principal[ENTRY_COLUMNS]], ignore_index=True)
+    return entries.astype({"county_key": "Int32", "msa_key": "Int32"})
+
+
+def subdivision_names(table):
+    """Distinct (place name, county key) pairs of a county subdivision attribute table, with the county from
+    common.shapefiles county_fips - the part of the table worth caching (see load_attribute_tables)."""
+    name_col = find_column(table, "NAME")
+    if name_col is None:
+        raise ValueError("No recognizable subdivision name column found.")
+
+    names = pd.DataFrame({"place": table[name_col].astype(str), "county_key": encode_county(county_fips(table))})
+    return names.drop_duplicates().reset_index(drop=True)
+
+
+def subdivision_places(names, state_names):
+    """Place entries from subdivision_names. `state_names` maps state keys to upper-case state names."""
+    return pd.DataFrame({
+        "state": county_state(names["county_key"]).map(state_names),
+        "place": names["place"],
+        "county_key": names["county_key"],
+        "msa_key": pd.array([pd.NA] * len(names), dtype="Int32"),
+        "kind": "subdivision",
+    })
+
+
+def place_entries(cw, subdivision_tables=None, state_abbrev=None):
+    """Place entries from a crosswalk vintage and subdivision names ({path: subdivision_names table}), with old
+    FIPS harmonized (fips_changes.py) and MSAs filled in from the crosswalk."""
+    counties = crosswalk_counties(cw)
+    state_names = counties.assign(state_key=county_state(counties["county_key"])).drop_duplicates("state_key")
+    state_names = state_names.set_index("state_key")["state"]
+    county_msa = pd.Series(counties["msa_key"].array, index=harmonize_fips(counties["county_key"])["FIPS"].array)
+    county_msa = county_msa[~county_msa.index.duplicated()]
+
+    parts = [crosswalk_places(cw, state_abbrev)]
+    parts += [subdivision_places(names, state_names) for names in (subdivision_tables or {}).values()]
+    entries = pd.concat(parts, ignore_index=True)
+    has_county = entries["county_key"].notna()
+    entries.loc[has_county, "county_key"] = harmonize_fips(entries.loc[has_county, "county_key"])["FIPS"].array
+    entries["msa_key"] = entries["msa_key"].fillna(entries["county_key"].map(county_msa)).astype("Int32")
+    entries["place"] = normalize_place(entries["place"])
+
+    entries = entries[entries["state"].notna() & entries["place"].notna() & (entries["place"] != "")]
+    return entries.drop_duplicates(["state", "place", "county_key", "msa_key"]).reset_index(drop=True)
+
+
+# ===============================
+# Index and resolution
+# ===============================
+def build_place_index(entries):
+    """{state: (exact, postings, sizes, county, msa)} for resolve_places.
+
+    exact maps a normalized place to its entry positions, postings maps a trigram to the positions of the
+    entries containing it, sizes holds each entry's trigram count, and county/msa its keys (-1 when missing).
+    """
+    index = {}
+    for state, group in entries.groupby("state", sort=False):
+        exact = {}
+        postings = {}
+        sizes = np.empty(len(group), dtype=np.int64)
+        for position, place in enumerate(group["place"]):
+            exact.setdefault(place, []).append(position)
+            grams = trigrams(place)
+            sizes[position] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        index[state] = (
+            {place: np.array(positions) for place, positions in exact.items()},
+            {gram: np.array(positions) for gram, positions in postings.items()},
+            sizes,
+            group["county_key"].fillna(-1).to_numpy(dtype=np.int64),
+            group["msa_key"].fillna(-1).to_numpy(dtype=np.int64),
+        )
+    return index
+
+
+def _match(state_index, place, min_score):
+    # (candidate positions, similarity, match kind) for one normalized place, or None
+    exact, postings, sizes = state_index[:3]
+    if place in exact:
+        return exact[place], 1.0, "exact"
+
+    grams = trigrams(place)
+    hits = [postings[gram] for gram in grams if gram in postings]
+    if not hits:
+        return None
+    shared = np.bincount(np.concatenate(hits), minlength=len(sizes))
+    dice = 2 * shared / (len(grams) + sizes)
+    best = dice.max()
+    if best < min_score:
+        return None
+    return np.flatnonzero(dice == best), float(best), "fuzzy"
+
+
+def _pick(state_index, positions):
+    # (county key, MSA key, share of the candidates with a county that agree on it), or None
+    county, msa = state_index[3][positions], state_index[4][positions]
+    with_county = county >= 0
+    if with_county.any():
+        keys, counts = np.unique(county[with_county], return_counts=True)
+        best = counts.argmax()
+        chosen = keys[best]
+        return chosen, msa[county == chosen][0], counts[best] / with_county.sum()
+    msas = np.unique(msa[msa >= 0])
+    if len(msas) == 1:
+        return -1, msas[0], 1.0
+    return None
+
+
+def resolve_places(index, city, state, min_score=MIN_SCORE):
+    """Resolve city/state pairs to county and MSA keys with a confidence score, aligned with `city`.
+
+    score is the name similarity (1 for an exact match of the normalized name, otherwise the Dice coefficient
+    of the trigram sets) times the share of the best-matching entries that agree on the county, so a name
+    found in several counties of a state scores low. MSA-only matches (a principal city of a multi-county MSA)
+    have no county key. Pairs that don't resolve get NA keys, a NaN score and no match kind.
+    """
+    queries = pd.MultiIndex.from_arrays([
+        normalize(state, categorical=False).to_numpy(),
+        normalize_place(city).to_numpy(),
+    ])
+    codes, pairs = pd.factorize(queries)
+
+    county_keys, msa_keys, scores, kinds = [], [], [], []
+    for query_state, place in pairs:
+        county, msa, score, kind = -1, -1, np.nan, None
+        if query_state in index and isinstance(place, str) and place:
+            found = _match(index[query_state], place, min_score)
+            picked = found and _pick(index[query_state], found[0])
+            if picked:
+                county, msa, share = picked
+                score, kind = found[1] * share, found[2]
+        county_keys.append(county)
+        msa_keys.append(msa)
+        scores.append(score)
+        kinds.append(kind)
+
+    # trailing unresolved row for code -1 (pairs with a missing part)
+    county_keys = np.array(county_keys + [-1], dtype=np.int64)
+    msa_keys = np.array(msa_keys + [-1], dtype=np.int64)
+    return pd.DataFrame({
+        "county_key": _keys(county_keys[codes]),
+        "msa_key": _keys(msa_keys[codes]),
+        "score": np.array(scores + [np.nan], dtype=float)[codes],
+        "match": np.array(kinds + [None], dtype=object)[codes],
+    }, index=city.index)
+
+
+def _keys(values):
+    # -1 -> <NA>
+    return pd.arrays.IntegerArray(values.astype(np.int32), values < 0)
+
+
+if __name__ == '__main__':
+    # check against the crosswalk vintage crosswalk_cleaning.py indexes: independent cities must resolve to
+    # their own county, not to a same-named county or an MSA
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check place resolution against a crosswalk vintage.")
+    parser.add_argument("--crosswalk", default=r"source/crosswalk/qcew-county-msa-csa-crosswalk.xlsx")
+    parser.add_argument("--sheet", default="Jul. 2023 Crosswalk")
+    args = parser.parse_args()
+
+    cw = pd.read_excel(args.crosswalk, sheet_name=args.sheet, dtype=str)
+    entries = place_entries(cw)
+    print(entries["kind"].value_counts().to_string())
+
+    expected = pd.DataFrame(
+        [
+            ("Richmond", "Virginia", 51760),
+            ("Norfolk", "Virginia", 51710),
+            ("Baltimore", "Maryland", 24510),
+            ("St. Louis", "Missouri", 29510),
+            ("Carson City", "Nevada", 32510),
+        ],
+        columns=["city", "state", "county_key"],
+    )
+    resolved = resolve_places(build_place_index(entries), expected["city"], expected["state"])
+    failed = expected[(resolved["county_key"] != expected["county_key"]).fillna(True) | (resolved["score"] < 1)]
+    if len(failed):
+        report = failed.join(resolved, rsuffix="_resolved").to_string()
+        raise SystemExit(f"Independent cities did not resolve to their county:\n{report}")
+    print(f"{len(expected)} independent cities resolved to their own county")
@@ -1,49 +1,46 @@
+import sys
+from pathlib import Path
+
 import pandas as pd
-import geopandas as gpd
 import numpy as np
-import csv
+
+from fips_changes import harmonize_fips
+from seer import aggregate_seer, build_cube, save_cube
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from common.columnar import write_table
+from common.geokeys import county_state, decode_county, decode_state, encode_county
+from common.shapefiles import county_fips, find_column, load_attribute_tables
 
 # ============================================================
 # STEP 0: SEER Historical County Population Estimates Processing
+# (fixed-width records decoded in blocks and summed per county-year as they are read - see seer.py)
 # ============================================================
 
-def clean_and_export_population_data(input_file, output_csv_file):
-    cleaned_data = []
-
-    with open(input_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if len(line) < 18:
-                continue
-            try:
-                cleaned_data.append({
-                    'Year': int(line[0:4]),
-                    'FIPS': line[6:11],
-                    'Population': int(line[18:]) if line[18:].isdigit() else None
-                })
-            except Exception:
-                continue
-
-    if cleaned_data:
-        with open(output_csv_file, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=cleaned_data[0].keys())
-            writer.writeheader()
-            writer.writerows(cleaned_data)
-
-
-clean_and_export_population_data(
-    r'F:\dsl_CLIMA\projects\submittable\missing persons\source\SEER Population Estimates\us_1969_2022.19ages.adjusted.txt',
-    r'F:\dsl_CLIMA\projects\submittable\missing persons\export\us_pop_by_decade.csv'
-)
+seer_file = r'F:\dsl_CLIMA\projects\submittable\missing persons\source\SEER Population Estimates\us_1969_2022.19ages.adjusted.txt'
+
+seer_fips, seer_year, seer_population = aggregate_seer(seer_file)
+
+# Optional: year x county x age x sex x race cube for demographic-specific denominators
+# (load with seer.load_cube, slice with seer.cube_population)
+BUILD_DEMOGRAPHIC_CUBE = False
+
+if BUILD_DEMOGRAPHIC_CUBE:
+    save_cube(
+        *build_cube(seer_file),
+        r'F:\dsl_CLIMA\projects\submittable\missing persons\export\seer_population_cube.npy'
+    )
 
 # ============================================================
 # STEP 1: Load Inputs
+# (FIPS are integer county keys until the export - see common/geokeys.py)
 # ============================================================
 
-df_population = pd.read_csv(
-    r'F:\dsl_CLIMA\projects\submittable\missing persons\export\us_pop_by_decade.csv',
-    dtype={'Year': int, 'FIPS': str}
-)
+df_population = pd.DataFrame({
+    'FIPS': pd.array(seer_fips, dtype='Int32'),
+    'Year': seer_year,
+    'Population': seer_population
+})
 
 df_cencount = pd.read_csv(
     r'F:\dsl_CLIMA\projects\submittable\missing persons\source\NBER County Population Estimates\cencounts.csv',
@@ -57,17 +54,11 @@ df_pop_est = pd.read_csv(
 )
 
 # ============================================================
-# STEP 2: Aggregate SEER + Append 2023–2024
+# STEP 2: Append 2023–2024 to the aggregated SEER totals
 # ============================================================
 
-df_population = (
-    df_population
-    .groupby(['FIPS', 'Year'], as_index=False)
-    .agg({'Population': 'sum'})
-)
-
-df_pop_est['FIPS'] = df_pop_est['STATE'] + df_pop_est['COUNTY']
-df_pop_est = df_pop_est[~df_pop_est['FIPS'].str.endswith('000')]
+df_pop_est['FIPS'] = encode_county(df_pop_est['STATE'] + df_pop_est['COUNTY'])
+df_pop_est = df_pop_est[df_pop_est['FIPS'] % 1000 != 0]  # state totals
 
 df_2023 = df_pop_est[['FIPS', 'POPESTIMATE2023']].rename(
     columns={'POPESTIMATE2023': 'Population'}
@@ -82,25 +73,30 @@ df_2024['Year'] = 2024
 df_population = pd.concat([df_population, df_2023, df_2024], ignore_index=True)
 
 # ============================================================
-# STEP 3: Normalize FIPS (NO corrections here)
+# STEP 3: Normalize FIPS
 # ============================================================
 
-df_population['FIPS'] = df_population['FIPS'].astype(str).str.zfill(5)
-df_population = df_population[
-    ~df_population['FIPS'].str.match(r'^\d{2}9\d{2}$')
-]
+# drop SSx9xx combined areas
+df_population = df_population[df_population['FIPS'] // 100 % 10 != 9]
 
-df_cencount['fips'] = df_cencount['fips'].astype(str).str.zfill(5)
+df_cencount['fips'] = encode_county(df_cencount['fips'])
 
 # ============================================================
-# STEP 4: Apply FIPS Corrections TO df_cencount (✅ FIX)
+# STEP 4: Harmonize FIPS (one join against the change table in fips_changes.py)
 # ============================================================
 
-fips_corrections = {
-    '12025': '12086',  # Miami-Dade → Dade
-}
+# population by (FIPS, year); codes folded into another county are summed with it
+df_population['FIPS'] = harmonize_fips(df_population['FIPS'], df_population['Year'])['FIPS']
+df_population = df_population.groupby(['FIPS', 'Year'], as_index=False, sort=False).agg({'Population': 'sum'})
 
-df_cencount['fips_corrected'] = df_cencount['fips'].replace(fips_corrections)
+# cencount is undated, so old codes map to their successor; a county's own row wins over one recoded into it
+df_cencount['fips_corrected'] = harmonize_fips(df_cencount['fips'])['FIPS']
+recoded = df_cencount['fips_corrected'] != df_cencount['fips']
+df_cencount = df_cencount[~(
+    recoded
+    & (df_cencount['fips_corrected'].isin(df_cencount.loc[~recoded, 'fips'])
+       | df_cencount['fips_corrected'].duplicated())
+)]
 
 # ============================================================
 # STEP 5: Authoritative Merge
@@ -124,23 +120,17 @@ df_nan['name_filled'] = None
 df_nan['source'] = None
 
 def build_fips_map(gdf):
-    if 'GEOID' in gdf.columns:
-        fips_col = 'GEOID'
-    elif 'STATEFP' in gdf.columns and 'COUNTYFP' in gdf.columns:
-        gdf['FIPS'] = gdf['STATEFP'].astype(str).str.zfill(2) + gdf['COUNTYFP'].astype(str).str.zfill(3)
-        fips_col = 'FIPS'
-    elif 'CNTY_FIPS' in gdf.columns:
-        gdf['FIPS'] = gdf['CNTY_FIPS'].astype(str).str.zfill(5)
-        fips_col = 'FIPS'
-    else:
-        raise ValueError("No recognizable FIPS columns found.")
-
-    for name_col in ['NAMELSAD', 'NAME', 'COUNTYNAME']:
-        if name_col in gdf.columns:
-            gdf[name_col] = gdf[name_col].astype(str).str.strip()
-            return dict(zip(gdf[fips_col].astype(str).str.zfill(5), gdf[name_col]))
-
-    raise ValueError("No recognizable county name column found.")
+    # county-level tables only: subdivision tables have many rows per county, none of them named after it
+    fips = county_fips(gdf)
+    if fips.dropna().duplicated().any():
+        raise ValueError("More than one row per county FIPS (a subdivision table?).")
+
+    # NHGIS county tables only carry the bare name ("Abbeville")
+    name_col = find_column(gdf, 'NAMELSAD', 'NAME', 'COUNTYNAME', 'NHGISNAM')
+    if name_col is None:
+        raise ValueError("No recognizable county name column found.")
+    fips_map = pd.DataFrame({'FIPS': encode_county(fips), 'name': gdf[name_col].astype(str).str.strip()})
+    return fips_map.dropna(subset=['FIPS']).reset_index(drop=True)
 
 county_shape_files = {
     2024: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\2024\counties\tl_2024_us_county.shp',
@@ -159,34 +149,25 @@ county_shape_files = {
     1910: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\1910\US_county_1910_conflated.shp',
     1900: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\1900\US_county_1900_conflated.shp'
 }
-subdivision_shape_files = {
-    2023: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\2023\subdivisions\US_cty_sub_2023.shp',
-    2022: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\2022\subdivisons\US_cty_sub_2022.shp',
-    2010: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\2010\subdivisions\US_cty_sub_2010.shp',
-    2000: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\2000\subdivisions\US_cty_sub_2000.shp',
-    1990: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\1990\subdivisions\US_cty_sub_1990.shp',
-    1980: r'F:\dsl_CLIMA\projects\Missing Persons Project\shape files\1980\subdivisions\US_mcd_1980.shp'
-}
-
-for year, path in county_shape_files.items():
-    gdf = gpd.read_file(path)
-    fips_map = build_fips_map(gdf)
-
-    mask = df_nan['name_filled'].isna()
-    matches = df_nan.loc[mask, 'FIPS'].map(fips_map)
 
-    df_nan.loc[mask, 'name_filled'] = matches
-    df_nan.loc[mask & matches.notna(), 'source'] = f'shapefile_{year}'
-
-for year, path in subdivision_shape_files.items():
-    gdf = gpd.read_file(path)
-    fips_map = build_fips_map(gdf)
-
-    mask = df_nan['name_filled'].isna()
-    matches = df_nan.loc[mask, 'FIPS'].map(fips_map)
+# Attribute tables only (no geometries), reduced to FIPS -> name per file and cached per .dbf (see
+# common/shapefiles.py), then combined into one FIPS -> (name, source) table where the first file listed above
+# that has a FIPS wins
+def load_fips_name_table(shape_files, cache_path):
+    fips_maps = load_attribute_tables([path for _, path in shape_files], cache_path, build_fips_map)
+    table = pd.concat(
+        [fips_maps[path].assign(source=source) for source, path in shape_files if path in fips_maps],
+        ignore_index=True
+    )
+    return table.drop_duplicates('FIPS', keep='first').set_index('FIPS')
+
+fips_names = load_fips_name_table(
+    [(f'shapefile_{year}', path) for year, path in county_shape_files.items()],
+    r'F:\dsl_CLIMA\projects\Missing Persons Project\working_dfs\shapefile_county_names.pkl'
+)
 
-    df_nan.loc[mask, 'name_filled'] = matches
-    df_nan.loc[mask & matches.notna(), 'source'] = f'shapefile_{year}'
+df_nan['name_filled'] = df_nan['FIPS'].map(fips_names['name'])
+df_nan['source'] = df_nan['FIPS'].map(fips_names['source'])
 
 df_nan['name'] = df_nan['name_filled']
 df_merged.update(df_nan[['FIPS', 'name', 'source']])
@@ -217,24 +198,25 @@ state_fips_to_abbr = {
     '54':'WV','55':'WI','56':'WY'
 }
 
-df_merged['state_abbr'] = df_merged['FIPS'].str[:2].map(state_fips_to_abbr)
+df_merged['state_abbr'] = decode_state(county_state(df_merged['FIPS'])).map(state_fips_to_abbr)
 df_merged['State'] = df_merged['state_abbr'].map(us_state_abbrev)
 df_merged = df_merged.drop(columns=['state_abbr'])
 df_merged['name'] = df_merged['name'].str.replace(r'^[A-Z]{2}\s+', '', regex=True)
 
-df_merged.loc[(df_merged['name'] == 'Dade County') & (df_merged['State'] == 'Florida'), 'name'] = 'Miami-Dade County'
-df_merged.loc[(df_merged['name'] == 'La Salle County') & (df_merged['State'] == 'Illinois'), 'name'] = 'Lasalle County'
-df_merged.loc[(df_merged['name'] == 'DeBaca County') & (df_merged['State'] == 'New Mexico'), 'name'] = 'De Baca County'
-df_merged.loc[(df_merged['name'] == 'St. John the Baptist Par.') & (df_merged['State'] == 'Louisiana'), 'name'] = 'St. John the Baptist Parish'
-df_merged.loc[(df_merged['name'] == 'Dona Ana County') & (df_merged['State'] == 'New Mexico'), 'name'] = 'DOÑA ANA COUNTY'
+# names as NamUs spells them, from the same change table
+harmonized_names = harmonize_fips(df_merged['FIPS'], df_merged['Year'])['name']
+df_merged['name'] = harmonized_names.where(df_merged['name'].notna() & harmonized_names.notna(), df_merged['name'])
 
 # ============================================================
-# STEP 7: Final Export
+# STEP 7: Final Export (CSV + typed Parquet copy)
 # ============================================================
 
-df_merged.to_csv(
+df_merged['FIPS'] = decode_county(df_merged['FIPS'])
+
+write_table(
+    df_merged,
     r'F:\dsl_CLIMA\projects\submittable\missing persons\export\population.csv',
-    index=False
+    categoricals=('State', 'name', 'source')
 )
 
 # print("✅ Export complete")
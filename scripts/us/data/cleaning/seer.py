@@ -0,0 +1,187 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+# ===============================
+# SEER county population file (us_1969_2022.19ages.adjusted.txt)
+#
+# Fixed-width ASCII, one record per line:
+#   cols 1-4   year            cols 12-13  registry     col 16      sex
+#   cols 5-6   state postal    col 14      race         cols 17-18  age group
+#   cols 7-11  state + county FIPS         col 15       origin      cols 19-26  population
+#
+# The file is memory-mapped and handed out as 2-D uint8 blocks (records x line width), so fields are decoded
+# for a whole block at once with NumPy instead of slicing strings line by line.
+# ===============================
+RECORD_WIDTH = 26
+BLOCK_RECORDS = 1 << 20
+
+YEAR = slice(0, 4)
+FIPS = slice(6, 11)
+RACE = slice(13, 14)
+ORIGIN = slice(14, 15)
+SEX = slice(15, 16)
+AGE = slice(16, 18)
+POPULATION = slice(18, 26)
+
+_NEWLINE = ord("\n")
+
+
+def decode(block, field):
+    """Decode one fixed-width digit field of a block into int64, with -1 where it isn't all digits."""
+    digits = block[:, field].astype(np.int64) - ord("0")
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    weights = 10 ** np.arange(digits.shape[1] - 1, -1, -1, dtype=np.int64)
+    return np.where(valid, digits @ weights, -1)
+
+
+def _line_blocks(path, block_records):
+    # fallback for files whose lines aren't all the same length: pad each record out to the fixed width
+    with open(path, 'rb') as f:
+        lines = []
+        for line in f:
+            line = line.strip()
+            if len(line) < 18:
+                continue
+            lines.append(line[:RECORD_WIDTH].ljust(RECORD_WIDTH))
+            if len(lines) == block_records:
+                yield np.frombuffer(b"".join(lines), dtype=np.uint8).reshape(-1, RECORD_WIDTH)
+                lines = []
+        if lines:
+            yield np.frombuffer(b"".join(lines), dtype=np.uint8).reshape(-1, RECORD_WIDTH)
+
+
+def iter_blocks(path, block_records=BLOCK_RECORDS):
+    """Yield the records of a SEER file as (records x line width) uint8 blocks."""
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    if not len(data):
+        return
+
+    # every line has the same length (26 characters plus \n or \r\n), so the file reshapes into a 2-D array
+    first_newline = np.flatnonzero(data[:4 * RECORD_WIDTH] == _NEWLINE)
+    line_width = int(first_newline[0]) + 1 if len(first_newline) else len(data)
+    n_records, tail = divmod(len(data), line_width)
+
+    records = data[:n_records * line_width].reshape(n_records, line_width)
+    fixed_width = line_width >= RECORD_WIDTH + 1 and (records[:, -1] == _NEWLINE).all()
+    if not fixed_width:
+        yield from _line_blocks(path, block_records)
+        return
+
+    for start in range(0, n_records, block_records):
+        yield records[start:start + block_records]
+    if tail:
+        # last line without a trailing newline
+        yield np.frombuffer(bytes(data[-tail:]).ljust(line_width), dtype=np.uint8).reshape(1, line_width)
+
+
+def aggregate_seer(path, block_records=BLOCK_RECORDS):
+    """Sum population per (FIPS, year) while the file is read; returns (fips, year, population) sorted by both.
+
+    Only the running totals - one per county-year - are kept between blocks, never the per-record table.
+    """
+    keys = np.empty(0, np.int64)
+    totals = np.empty(0, np.int64)
+    for block in iter_blocks(path, block_records):
+        year = decode(block, YEAR)
+        fips = decode(block, FIPS)
+        population = decode(block, POPULATION)
+        keep = (year >= 0) & (fips >= 0) & (population >= 0)
+
+        # fold this block into the running totals: the key sorts by FIPS, then year
+        block_keys = np.concatenate([keys, fips[keep] * 10000 + year[keep]])
+        block_values = np.concatenate([totals, population[keep]])
+        keys, inverse = np.unique(block_keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=block_values, minlength=len(keys)).astype(np.int64)
+
+    return keys // 10000, keys % 10000, totals
+
+
+# ===============================
+# Demographic population cube
+#
+# Dense int32 array of population by year x county x age group x sex x race (Hispanic origin summed over),
+# saved as a .npy file that np.load can memory-map, with its axis labels in a .json file next to it.
+# ===============================
+CUBE_AXES = ("year", "fips", "age", "sex", "race")
+
+AGE_GROUPS = [
+    "0", "1-4", "5-9", "10-14", "15-19", "20-24", "25-29", "30-34", "35-39", "40-44",
+    "45-49", "50-54", "55-59", "60-64", "65-69", "70-74", "75-79", "80-84", "85+",
+]
+SEX_LABELS = {1: "Male", 2: "Female"}
+RACE_LABELS = {1: "White", 2: "Black", 3: "Other"}
+
+
+def build_cube(path, block_records=BLOCK_RECORDS):
+    """Return (cube, axes) for a SEER file; axes maps each name in CUBE_AXES to its codes in cube order.
+
+    Reads the file twice: once for the years and counties present, then again to fill the preallocated cube.
+    """
+    fields = {"year": YEAR, "fips": FIPS, "age": AGE, "sex": SEX, "race": RACE}
+
+    # pass 1: distinct codes on every axis, so the cube can be allocated once
+    seen = {name: set() for name in CUBE_AXES}
+    for block in iter_blocks(path, block_records):
+        for name, field in fields.items():
+            seen[name].update(np.unique(decode(block, field)).tolist())
+    codes = {name: np.array(sorted(seen[name] - {-1}), dtype=np.int64) for name in CUBE_AXES}
+
+    # pass 2: accumulate each record into its cell
+    cube = np.zeros([len(codes[name]) for name in CUBE_AXES], dtype=np.int32)
+    flat = cube.reshape(-1)
+    for block in iter_blocks(path, block_records):
+        population = decode(block, POPULATION)
+        keep = population >= 0
+        index = np.zeros(len(block), dtype=np.int64)
+        for name in CUBE_AXES:
+            values = decode(block, fields[name])
+            keep &= values >= 0
+            index = index * len(codes[name]) + np.searchsorted(codes[name], values)
+        np.add.at(flat, index[keep], population[keep].astype(np.int32))
+
+    axes = {
+        "year": codes["year"].tolist(),
+        "fips": [f"{code:05d}" for code in codes["fips"]],
+        "age": [AGE_GROUPS[code] if code < len(AGE_GROUPS) else str(code) for code in codes["age"]],
+        "sex": [SEX_LABELS.get(code, str(code)) for code in codes["sex"]],
+        "race": [RACE_LABELS.get(code, str(code)) for code in codes["race"]],
+    }
+    return cube, axes
+
+
+def save_cube(cube, axes, path):
+    """Write the cube to `path` (.npy) and its axis labels to the matching .json file."""
+    path = Path(path)
+    np.save(path, cube)
+    with open(path.with_suffix(".json"), "w", encoding="utf-8") as f:
+        json.dump({"dims": list(CUBE_AXES), "dtype": str(cube.dtype), "axes": axes}, f, indent=2)
+    return path
+
+
+def load_cube(path):
+    """Return (cube, axes) for a saved cube, with the cube memory-mapped read-only."""
+    path = Path(path)
+    with open(path.with_suffix(".json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return np.load(path, mmap_mode="r"), meta["axes"]
+
+
+def cube_population(cube, axes, age=None, sex=None, race=None):
+    """(fips, year, population) arrays summed over the selected age groups, sexes and races (all by default).
+
+    e.g. cube_population(cube, axes, age=["15-19", "20-24"], sex=["Female"]) for women aged 15-24. The cube
+    is dense, so county-years missing from the SEER file come back with population 0.
+    """
+    selected = cube
+    for axis, labels in ((2, age), (3, sex), (4, race)):
+        if labels is not None:
+            index = [axes[CUBE_AXES[axis]].index(label) for label in labels]
+            selected = np.take(selected, index, axis=axis)
+    totals = selected.sum(axis=(2, 3, 4), dtype=np.int64)  # year x county
+
+    years = np.asarray(axes["year"], dtype=np.int64)
+    fips = np.array([int(code) for code in axes["fips"]], dtype=np.int64)
+    # county-major, like aggregate_seer
+    return np.repeat(fips, len(years)), np.tile(years, len(fips)), totals.T.reshape(-1)
@@ -0,0 +1,83 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import namus
+from mock_namus import MockNamUs, add_mock_arguments
+
+# end-to-end scrape throughput against the local mock API, so scraper changes can be compared with real numbers:
+#   python benchmark.py --cases 10000 100000 --workers 32 --latency-ms 50
+
+
+def run_benchmark(cases, workers, rate, mock_kwargs, quiet=True):
+    mock = MockNamUs(cases=cases, **mock_kwargs)
+    server = mock.serve()
+    namus.API_BASE = f"http://127.0.0.1:{server.server_address[1]}"
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # namus.py writes into ./output
+        os.chdir(tmp)
+        os.mkdir("output")
+        try:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+                namus.main(workers=workers, rate=rate, report="output/report.json")
+            elapsed_s = time.perf_counter() - started
+
+            with open("output/report.json", "r") as f:
+                report = json.load(f)
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+            server.server_close()
+
+    return {
+        "cases": cases,
+        "workers": workers,
+        "rate": rate,
+        "elapsed_s": round(elapsed_s, 2),
+        "cases_per_s": round(cases / elapsed_s, 1),
+        "requests_per_s": report["requests_per_s"],
+        "case_latency": {k: report["latency"]["case"][k] for k in ("p50_ms", "p95_ms", "p99_ms")},
+        "outcomes": report["outcomes"],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark namus.py end to end against the mock NamUs API.")
+    parser.add_argument("--cases", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=0.0, help="scraper rate limit (0 disables)")
+    parser.add_argument("--verbose", action="store_true", help="show the scraper's own output")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    mock_kwargs = {
+        "latency_ms": args.latency_ms,
+        "p404": args.p404,
+        "p429": args.p429,
+        "p500": args.p500,
+        "retry_after_s": args.retry_after,
+        "payload_bytes": args.payload_bytes,
+        "seed": args.seed,
+    }
+
+    results = []
+    for cases in args.cases:
+        result = run_benchmark(cases, args.workers, args.rate, mock_kwargs, quiet=not args.verbose)
+        print(
+            f"{cases} cases: {result['elapsed_s']}s, {result['cases_per_s']} cases/s, "
+            f"p50 {result['case_latency']['p50_ms']}ms p99 {result['case_latency']['p99_ms']}ms, "
+            f"outcomes {result['outcomes']}"
+        )
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,128 @@
+import argparse
+import datetime
+import hashlib
+import json
+import sqlite3
+
+# optional SQLite home for scraped NamUs cases, keyed by namus2Number (the case "id" field)
+# the raw JSON is stored untouched so the one-case-per-line snapshot can be rebuilt byte-for-byte without
+# re-serializing anything, which keeps namus_cleaning.py working off the exported file
+# fetched_at is when a case's current content was first stored: a re-upsert of an unchanged case (a carried-over
+# or earlier-run case in the journal) leaves the row alone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    namus2_number INTEGER PRIMARY KEY,
+    state TEXT,
+    last_contact_date TEXT,
+    fetched_at TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    raw_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cases_state ON cases (state);
+CREATE INDEX IF NOT EXISTS cases_last_contact_date ON cases (last_contact_date);
+"""
+
+UPSERT = """
+INSERT INTO cases (namus2_number, state, last_contact_date, fetched_at, content_hash, raw_json)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (namus2_number) DO UPDATE SET
+    state = excluded.state,
+    last_contact_date = excluded.last_contact_date,
+    fetched_at = excluded.fetched_at,
+    content_hash = excluded.content_hash,
+    raw_json = excluded.raw_json
+WHERE cases.content_hash != excluded.content_hash
+"""
+
+
+def case_row(line, fetched_at):
+    # `line` is one already-serialized case
+    case = json.loads(line)
+    sighting = case.get("sighting") or {}
+    address = sighting.get("address") or {}
+    state = (address.get("state") or {}).get("name")
+    content_hash = hashlib.sha256(line.encode("utf-8")).hexdigest()
+    return case["id"], state, sighting.get("date"), fetched_at, content_hash, line
+
+
+def snapshot_lines(path):
+    # streams the cases out of a one-case-per-line snapshot without loading the whole array
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip().rstrip(",")
+            if line and line not in ("[", "]"):
+                yield line
+
+
+class CaseStore:
+    def __init__(self, path="output/namus.sqlite"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+
+    def upsert_lines(self, lines, fetched_at=None, batch_size=1000):
+        # bulk upsert in one transaction per batch - returns the number of cases inserted or changed
+        if fetched_at is None:
+            fetched_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+        changes_before = self.conn.total_changes
+        batch = []
+        with self.conn:
+            for line in lines:
+                batch.append(case_row(line, fetched_at))
+                if len(batch) == batch_size:
+                    self.conn.executemany(UPSERT, batch)
+                    batch = []
+            if batch:
+                self.conn.executemany(UPSERT, batch)
+        return self.conn.total_changes - changes_before
+
+    def upsert(self, cases, fetched_at=None):
+        return self.upsert_lines((json.dumps(case) for case in cases), fetched_at)
+
+    def get(self, case_id):
+        row = self.conn.execute("SELECT raw_json FROM cases WHERE namus2_number = ?", (case_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def ids_by_state(self, state):
+        rows = self.conn.execute("SELECT namus2_number FROM cases WHERE state = ? ORDER BY namus2_number", (state,))
+        return [row[0] for row in rows]
+
+    def export_json(self, path):
+        # same layout as namus.save_cases: a JSON array with one tab-indented case per line, sorted by case ID
+        rows = self.conn.execute("SELECT raw_json FROM cases ORDER BY namus2_number")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[\n")
+            first = True
+            for (raw_json,) in rows:
+                if not first:
+                    f.write(",\n")
+                f.write("\t")
+                f.write(raw_json)
+                first = False
+            if not first:
+                f.write("\n")
+            f.write("]\n")
+        return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load or export the SQLite NamUs case store.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("json_path", help="snapshot to import from / export to")
+    parser.add_argument("--db", default="output/namus.sqlite")
+    args = parser.parse_args()
+
+    store = CaseStore(args.db)
+    if args.command == "import":
+        print(f"Upserted {store.upsert_lines(snapshot_lines(args.json_path))} new or changed cases into {args.db}")
+    else:
+        print(f"Exported {len(store)} cases to {store.export_json(args.json_path)}")
+    store.close()
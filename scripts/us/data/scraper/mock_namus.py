@@ -0,0 +1,208 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# local stand-in for the three NamUs endpoints namus.py talks to, for benchmarking and testing the scraper
+# without hitting the live service:
+#   GET  /States
+#   POST /MissingPersons/Search   (skip/take paging, stateOfLastContact predicate)
+#   GET  /MissingPersons/Cases/{id}
+# point the scraper at it with `namus.py --base-url http://127.0.0.1:PORT`
+
+STATES = [
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", "Delaware",
+    "District of Columbia", "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa", "Kansas",
+    "Kentucky", "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota", "Mississippi",
+    "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire", "New Jersey", "New Mexico", "New York",
+    "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon", "Pennsylvania", "Rhode Island",
+    "South Carolina", "South Dakota", "Tennessee", "Texas", "Utah", "Vermont", "Virginia", "Washington",
+    "West Virginia", "Wisconsin", "Wyoming",
+]
+SEXES = ["Male", "Female", "Unsure"]
+ETHNICITIES = ["White / Caucasian", "Black / African American", "Hispanic / Latino", "Asian", "Other", "Uncertain"]
+
+CASE_PATH = re.compile(r"^/MissingPersons/Cases/(\d+)$")
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 resets connections as soon as the scraper runs more workers than that
+    request_queue_size = 512
+
+
+def synthetic_case(case_id, state, payload_bytes=0):
+    # shaped like the fields namus_cleaning.py reads; `payload_bytes` pads it out towards the size of a real case
+    rng = random.Random(case_id)
+    min_age = rng.randint(0, 80)
+    case = {
+        "id": case_id,
+        "idFormatted": f"MP{case_id}",
+        "subjectIdentification": {"currentMinAge": min_age, "currentMaxAge": min_age + rng.randint(0, 5)},
+        "subjectDescription": {
+            "sex": {"name": rng.choice(SEXES)},
+            "primaryEthnicity": {"name": rng.choice(ETHNICITIES)},
+        },
+        "sighting": {
+            "date": f"{rng.randint(1969, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "address": {
+                "city": f"City {rng.randint(1, 500)}",
+                "state": {"name": state},
+                "county": {"name": f"County {rng.randint(1, 100)}"},
+            },
+        },
+        "primaryInvestigatingAgency": {"name": f"Agency {rng.randint(1, 1000)}"},
+    }
+    if payload_bytes:
+        case["narrative"] = "x" * payload_bytes
+    return case
+
+
+class MockNamUs:
+    def __init__(
+        self,
+        cases=10000,
+        latency_ms=0.0,
+        p404=0.0,
+        p429=0.0,
+        p500=0.0,
+        retry_after_s=1,
+        payload_bytes=0,
+        seed=0,
+    ):
+        # case IDs are spread over the states round-robin; 404s are fixed per case (the case "was removed"),
+        # while 429s and 500s are drawn per request so retries can succeed
+        self.ids_by_state = {state: [] for state in STATES}
+        self.state_of = {}
+        for i, case_id in enumerate(range(1, cases + 1)):
+            state = STATES[i % len(STATES)]
+            self.ids_by_state[state].append(case_id)
+            self.state_of[case_id] = state
+
+        rng = random.Random(seed)
+        self.removed = {case_id for case_id in self.state_of if rng.random() < p404}
+        self.latency_ms = latency_ms
+        self.p429 = p429
+        self.p500 = p500
+        self.retry_after_s = retry_after_s
+        self.payload_bytes = payload_bytes
+        self.rng = random.Random(seed + 1)
+        self.rng_lock = threading.Lock()
+
+    def roll(self):
+        with self.rng_lock:
+            return self.rng.random()
+
+    def sleep(self):
+        if self.latency_ms:
+            # +-50% around the configured latency
+            with self.rng_lock:
+                jitter = self.rng.uniform(0.5, 1.5)
+            time.sleep(self.latency_ms * jitter / 1000)
+
+    def handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, so pooled connections behave like they would against the real server
+            protocol_version = "HTTP/1.1"
+            # headers and body go out in two writes; with Nagle on, the body waits for the client's delayed ACK
+            # of the headers (~40 ms per request on a reused connection)
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                mock.sleep()
+                if self.path == "/States":
+                    return self.send_json(200, [{"name": state} for state in STATES])
+
+                match = CASE_PATH.match(self.path)
+                if match is None:
+                    return self.send_json(404, {"message": "not found"})
+
+                case_id = int(match.group(1))
+                if case_id not in mock.state_of or case_id in mock.removed:
+                    return self.send_json(404, {"message": "case not found"})
+
+                roll = mock.roll()
+                if roll < mock.p429:
+                    return self.send_json(429, {"message": "slow down"}, {"Retry-After": str(mock.retry_after_s)})
+                if roll < mock.p429 + mock.p500:
+                    return self.send_json(500, {"message": "internal error"})
+
+                self.send_json(200, synthetic_case(case_id, mock.state_of[case_id], mock.payload_bytes))
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                mock.sleep()
+                if self.path != "/MissingPersons/Search":
+                    return self.send_json(404, {"message": "not found"})
+
+                states = STATES
+                for predicate in body.get("predicates", []):
+                    if predicate.get("field") == "stateOfLastContact":
+                        states = predicate.get("values", [])
+                ids = sorted(case_id for state in states for case_id in mock.ids_by_state.get(state, []))
+
+                skip = body.get("skip", 0)
+                take = min(body.get("take", 10000), 10000)
+                page = ids[skip:skip + take]
+                self.send_json(200, {"count": len(ids), "results": [{"namus2Number": case_id} for case_id in page]})
+
+        return Handler
+
+    def serve(self, host="127.0.0.1", port=0):
+        # starts the server on a background thread and returns it; the bound port is server.server_address[1]
+        server = MockServer((host, port), self.handler())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def add_mock_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean response latency (+-50%%)")
+    parser.add_argument("--p404", type=float, default=0.0, help="fraction of cases that 404")
+    parser.add_argument("--p429", type=float, default=0.0, help="chance a case request is throttled")
+    parser.add_argument("--p500", type=float, default=0.0, help="chance a case request fails with a 500")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="padding added to each case payload")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a local mock of the NamUs API.")
+    parser.add_argument("--cases", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=8000)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    mock = MockNamUs(
+        cases=args.cases,
+        latency_ms=args.latency_ms,
+        p404=args.p404,
+        p429=args.p429,
+        p500=args.p500,
+        retry_after_s=args.retry_after,
+        payload_bytes=args.payload_bytes,
+        seed=args.seed,
+    )
+    server = mock.serve(port=args.port)
+    print(f"Mock NamUs API with {args.cases} cases on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
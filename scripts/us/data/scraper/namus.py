@@ -1,7 +1,21 @@
+import argparse
+import collections
 import datetime
+import email.utils
+import glob
+import heapq
 import json
+import os
+import random
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from case_store import CaseStore
+from scrape_metrics import ScrapeMetrics
 
 # This file is published by Night Owl Reconnaissance, which is a 
 # 501(c)3 non-profit organization dedicated to using detection and 
@@ -9,56 +23,172 @@ import requests
 # Their github is linked here:
 # https://github.com/NightOwlRecon
 
+# overridable with --base-url so the scraper can be pointed at a local stub server
+API_BASE = "https://www.namus.gov/api/CaseSets/NamUs"
+
+# (connect, read) timeouts in seconds - without one a stalled connection would hang its worker forever
+TIMEOUT = (10, 60)
+
+
+def make_session(pool_size=8):
+    # one keep-alive session shared by every call, so tens of thousands of small fetches reuse a handful of
+    # TCP+TLS connections instead of paying a handshake each; pool_block keeps us from opening more than
+    # pool_size connections when more threads than that are running
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+SESSION = make_session()
+
+
+def configure_session(pool_size=8, connect_timeout=10, read_timeout=60):
+    global SESSION, TIMEOUT
+    SESSION.close()
+    SESSION = make_session(pool_size)
+    TIMEOUT = (connect_timeout, read_timeout)
+
+
+def wire_bytes(res):
+    # size of the response body as sent: with gzip, len(res.content) is the decompressed size, while
+    # Content-Length is what came over the wire; chunked responses have no Content-Length, so fall back to
+    # urllib3's count of bytes read, then to the body itself
+    length = res.headers.get("Content-Length", "")
+    if length.isdigit():
+        return int(length)
+    return res.raw.tell() or len(res.content)
 
-# currently unused except for manual reformatting of previous output
-# may be useful in situations where we only want to query records we don't already have a copy of
-def load_stored_cases():
-    with open("output/namus-20240811.json", "r") as f:
+
+def latest_snapshot():
+    # snapshot names sort by date, so the last one is the most recent
+    snapshots = sorted(glob.glob("output/namus-*.json"))
+    return snapshots[-1] if snapshots else None
+
+
+# used by --incremental to only query records we don't already have a copy of
+def load_stored_cases(path=None):
+    if path is None:
+        path = latest_snapshot()
+    with open(path, "r") as f:
         cases = json.load(f)
     return cases
 
 
-def save_cases(cases):
-    # this is a very naive way to save cases - we should probably use a database
-    date = datetime.datetime.now().strftime("%Y%m%d")
+def plan_incremental(case_ids, stored, refresh_fraction=0.01):
+    # new cases are always fetched; a random sample of the ones we already have is re-fetched as well so
+    # edits on the NamUs side eventually make it into the snapshot
+    new_ids = [case_id for case_id in case_ids if case_id not in stored]
+    existing_ids = [case_id for case_id in case_ids if case_id in stored]
+    refresh_ids = random.sample(existing_ids, min(len(existing_ids), round(len(existing_ids) * refresh_fraction)))
+    return new_ids, refresh_ids
 
-    # sort by case ID first
-    cases.sort(key=lambda x: x["id"])
 
-    with open(f"output/namus-{date}.json", "w") as f:
+def save_cases(lines, path=None):
+    # this is a very naive way to save cases - pass --db to also keep them in the SQLite store (case_store.py)
+    # `lines` are already-serialized cases, sorted by case ID (see CaseJournal.sorted_lines)
+    if path is None:
+        date = datetime.datetime.now().strftime("%Y%m%d")
+        path = f"output/namus-{date}.json"
+
+    with open(path, "w", encoding="utf-8") as f:
         # handling this manually to keep a one-case-per-line format for easy diffing while still maintaining a valid
         # JSON object (versus jsonlines which would add another dependency for using the data)
 
         # open the JSON array
         f.write("[\n")
 
-        for case in cases:
+        first = True
+        for line in lines:
+            # comma goes before every entry but the first to maintain a valid JSON object
+            if not first:
+                f.write(",\n")
             # add a tab before each line to make it pretty
             f.write("\t")
-            json.dump(case, f)
-            # skip the final comma on the last entry to maintain a valid JSON object
-            if case == cases[-1]:
-                f.write("\n")
-            else:
-                f.write(",\n")
+            f.write(line)
+            first = False
+
+        if not first:
+            f.write("\n")
         # close the JSON array
         f.write("]\n")
 
+    return path
+
+
+class CaseJournal:
+    # append-only, one-case-per-line file that cases are written to as soon as they arrive, so a crashed scrape
+    # can pick up where it left off; only case ID -> byte offset is kept in memory
+    def __init__(self, path="output/namus.journal"):
+        self.path = path
+        self.offsets = {}
+
+        try:
+            with open(path, "rb+") as f:
+                while True:
+                    offset = f.tell()
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        # a crash mid-write leaves a partial last line - drop it
+                        f.truncate(offset)
+                        break
+                    self.offsets[json.loads(line)["id"]] = offset
+        except FileNotFoundError:
+            pass
+
+        self.f = open(path, "ab")
+
+    def __contains__(self, case_id):
+        return case_id in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, case):
+        offset = self.f.tell()
+        self.f.write(json.dumps(case).encode("utf-8") + b"\n")
+        self.f.flush()
+        # a re-fetched case supersedes the earlier line
+        self.offsets[case["id"]] = offset
+
+    def sorted_lines(self):
+        self.f.flush()
+        with open(self.path, "rb") as f:
+            for case_id in sorted(self.offsets):
+                f.seek(self.offsets[case_id])
+                yield f.readline().rstrip(b"\n").decode("utf-8")
+
+    def compact(self, path=None):
+        # write the sorted JSON array snapshot and retire the journal
+        path = save_cases(self.sorted_lines(), path)
+        self.f.close()
+        os.remove(self.path)
+        return path
+
 
 def get_states():
     # could hard-code these instead of making a request - highly unlikely to change
     # don't bother catching exceptions here - if this fails we have bigger issues
-    states = [state["name"] for state in requests.get("https://www.namus.gov/api/CaseSets/NamUs/States").json()]
+    states = [state["name"] for state in SESSION.get(f"{API_BASE}/States", timeout=TIMEOUT).json()]
     return states
 
 
-def get_cases_by_state(state):
-    res = requests.post(
-        "https://www.namus.gov/api/CaseSets/NamUs/MissingPersons/Search",
+# the search endpoint silently truncates anything past `take`, so states are paged through with skip/take
+SEARCH_PAGE_SIZE = 1000
+
+
+def get_cases_by_state(state, skip=0, take=SEARCH_PAGE_SIZE):
+    # one page of the search for a state - the raw response, parsed by search_page
+    res = SESSION.post(
+        f"{API_BASE}/MissingPersons/Search",
+        timeout=TIMEOUT,
         headers={"Content-Type": "application/json"},
         data=json.dumps(
             {
-                "take": 10000,
+                "skip": skip,
+                "take": take,
                 "projections": ["namus2Number"],
                 "predicates": [
                     {
@@ -67,69 +197,370 @@ def get_cases_by_state(state):
                         "values": [state],
                     }
                 ],
+                # a stable order so pages don't overlap or skip cases
+                "orderSpecifications": [{"field": "namus2Number", "direction": "Ascending"}],
             }
         ),
-    ).json()
+    )
+    return res
 
-    case_ids = [case["namus2Number"] for case in res["results"]]
-    return case_ids
 
+def search_page(state, skip=0, take=SEARCH_PAGE_SIZE, bucket=None, metrics=None, max_attempts=8):
+    # returns one page of case IDs plus the total number of matches the server reports for the state
+    # pages share the token bucket and backoff of the case fetches; a page that keeps failing stops the scrape,
+    # since carrying on would silently drop its cases
+    for attempt in range(1, max_attempts + 1):
+        if bucket is not None:
+            bucket.acquire()
+        res = None
+        started = time.perf_counter()
+        try:
+            res = get_cases_by_state(state, skip, take)
+            if metrics is not None:
+                metrics.record_request("search", time.perf_counter() - started, res.status_code, wire_bytes(res))
+            res.raise_for_status()
+            body = res.json()
+            if "count" not in body or "results" not in body:
+                raise ValueError(f"search response without count/results: {res.text[:200]}")
+            return [case["namus2Number"] for case in body["results"]], body["count"]
+        except Exception as e:
+            if res is None and metrics is not None:
+                metrics.record_request("search", time.perf_counter() - started, classify_failure(None, e))
+            if attempt == max_attempts:
+                raise RuntimeError(f"Search for {state} (skip {skip}) failed after {max_attempts} attempts") from e
 
-def get_case_by_id(case_id):
-    case = requests.get(f"https://www.namus.gov/api/CaseSets/NamUs/MissingPersons/Cases/{case_id}")
-    return case
+            failure_class = classify_failure(res, e)
+            retry_after = parse_retry_after(res.headers.get("Retry-After")) if res is not None else None
+            delay_s = backoff_s(failure_class, attempt, retry_after)
+            print(f"Search for {state} (skip {skip}) failed ({failure_class}: {e}), retrying in {delay_s:.1f} seconds")
+            time.sleep(delay_s)
 
 
-def main():
-    failures = 0
-    cases = []
-    case_ids = []
+def search_case_ids(states, workers=8, page_size=SEARCH_PAGE_SIZE, rate=10.0, max_attempts=8, metrics=None):
+    # first page of every state in parallel to learn the totals, then all remaining pages in parallel
+    bucket = TokenBucket(rate, capacity=workers) if rate else None
+    ids_by_state = {}
+    totals = {}
 
-    states = get_states()
+    def page(state, skip):
+        return search_page(state, skip, page_size, bucket, metrics, max_attempts)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        first_pages = {state: pool.submit(page, state, 0) for state in states}
+        for state, future in first_pages.items():
+            ids_by_state[state], totals[state] = future.result()
+
+        pages = {
+            pool.submit(page, state, skip): state
+            for state in states
+            for skip in range(page_size, totals[state], page_size)
+        }
+        for future in as_completed(pages):
+            ids_by_state[pages[future]].extend(future.result()[0])
 
     for state in states:
-        ids = get_cases_by_state(state)
-        print(f"Found {len(ids)} cases in {state}")
-        case_ids.extend(ids)
+        found = len(set(ids_by_state[state]))
+        if found == totals[state]:
+            print(f"Found {found} cases in {state}")
+        else:
+            print(f"Found {found} cases in {state}, but the server reported {totals[state]}")
 
-    print(f"Found {len(case_ids)} total ")
+    return ids_by_state, totals
+
+
+def get_case_by_id(case_id):
+    case = SESSION.get(f"{API_BASE}/MissingPersons/Cases/{case_id}", timeout=TIMEOUT)
+    return case
+
+
+class TokenBucket:
+    # classic token bucket shared by all fetch threads - refills at `rate` tokens per second and
+    # holds at most `capacity` tokens, so short bursts are allowed but the long-run rate is capped
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
 
-    for i in range(len(case_ids)):
+    def acquire(self):
         while True:
-            case_id = case_ids[i]
-            print(f"Getting case ID {case_id} ({i+1}/{len(case_ids)} - {100*(i+1)/len(case_ids):.2f}%)")
-            try:
-                case = get_case_by_id(case_id)
-                cases.append(case.json())
-                failures = 0
-                break  # this break exits from the exponential backoff loop
-            except Exception as e:
-                print(f"Failed to get case ID {case_id}: {e}")
-                print(case)
-                print(case.text)
-                print(case.status_code)
-
-                # a 404 response seems to indicate that the case was removed
-                # between the time hat the search results were generated and
-                # the time that we tried to fetch the case, so we simply skip
-                # it.
-                # unsure if this actually indicates the case was removed
-                # after the time we executed the search, or if those results
-                # were stale when we got them.
-                if case.status_code == 404:
-                    break  # move on to the next case
-
-                # very dumb exponential backoff
-                failures += 1
-                if failures == 13:  # 2^12 = 4096 seconds = ~68 minutes
-                    print("Too many failures, exiting")
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
                     return
-                delay_s = pow(2, failures)
-                print(f"Failures: {failures}, sleeping for {delay_s} seconds")
-                time.sleep(delay_s)
+                wait_s = (1 - self.tokens) / self.rate
+            # sleep outside the lock so other threads can keep checking the bucket
+            time.sleep(wait_s)
 
-    save_cases(cases)
+
+# base backoff per failure class, in seconds - throttling gets a longer runway than a dropped connection
+RETRY_BASE_S = {
+    "429": 5.0,
+    "5xx": 2.0,
+    "timeout": 1.0,
+    "error": 2.0,
+}
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds(), 0.0)
+
+
+def classify_failure(response, exc):
+    if response is None:
+        # no response at all - connection reset, DNS hiccup or a read timeout
+        return "timeout" if isinstance(exc, (requests.Timeout, requests.ConnectionError)) else "error"
+    if response.status_code == 429:
+        return "429"
+    if response.status_code >= 500:
+        return "5xx"
+    return "error"
+
+
+def backoff_s(failure_class, attempts, retry_after=None, max_delay_s=600.0):
+    # "full jitter" exponential backoff so retries from many workers don't land in lockstep
+    delay_s = random.uniform(0, min(max_delay_s, RETRY_BASE_S[failure_class] * pow(2, attempts)))
+    if retry_after is not None:
+        # the server told us when to come back - never retry earlier than that
+        delay_s = max(delay_s, retry_after + random.uniform(0, 1))
+    return delay_s
+
+
+class RetryScheduler:
+    # keeps the queue of case IDs still to fetch; failed IDs are pushed back with a per-case delay
+    # instead of sleeping, so the remaining workers keep pulling other cases in the meantime
+    def __init__(self, case_ids, max_attempts=8, max_delay_s=600.0):
+        self.ready = collections.deque(case_ids)
+        self.delayed = []  # heap of (ready_at, case_id)
+        self.max_attempts = max_attempts
+        self.max_delay_s = max_delay_s
+        self.failures = collections.Counter()  # per case ID
+        self.class_failures = collections.Counter()  # per failure class
+        self.gave_up = []
+
+    def pending(self):
+        return bool(self.ready or self.delayed)
+
+    def next_ready(self):
+        now = time.monotonic()
+        while self.delayed and self.delayed[0][0] <= now:
+            self.ready.append(heapq.heappop(self.delayed)[1])
+        return self.ready.popleft() if self.ready else None
+
+    def next_wakeup_s(self):
+        if not self.delayed:
+            return None
+        return max(self.delayed[0][0] - time.monotonic(), 0.0)
+
+    def retry(self, case_id, failure_class, retry_after=None):
+        # returns the delay before the case is retried, or None if we gave up on it
+        self.failures[case_id] += 1
+        self.class_failures[failure_class] += 1
+        attempts = self.failures[case_id]
+        if attempts >= self.max_attempts:
+            self.gave_up.append(case_id)
+            return None
+
+        delay_s = backoff_s(failure_class, attempts, retry_after, self.max_delay_s)
+        heapq.heappush(self.delayed, (time.monotonic() + delay_s, case_id))
+        return delay_s
+
+
+def fetch_case(case_id, bucket=None, metrics=None):
+    # a single attempt - returns ("ok", case, None), ("skip", None, None) for a 404,
+    # or ("retry", failure_class, retry_after)
+    if bucket is not None:
+        bucket.acquire()
+    case = None
+    started = time.perf_counter()
+    try:
+        case = get_case_by_id(case_id)
+        if metrics is not None:
+            metrics.record_request("case", time.perf_counter() - started, case.status_code, wire_bytes(case))
+        case.raise_for_status()
+        return "ok", case.json(), None
+    except Exception as e:
+        if case is None and metrics is not None:
+            metrics.record_request("case", time.perf_counter() - started, classify_failure(None, e))
+
+        # a 404 response seems to indicate that the case was removed
+        # between the time hat the search results were generated and
+        # the time that we tried to fetch the case, so we simply skip
+        # it.
+        # unsure if this actually indicates the case was removed
+        # after the time we executed the search, or if those results
+        # were stale when we got them.
+        if case is not None and case.status_code == 404:
+            return "skip", None, None
+
+        print(f"Failed to get case ID {case_id}: {e}")
+        retry_after = parse_retry_after(case.headers.get("Retry-After")) if case is not None else None
+        return "retry", classify_failure(case, e), retry_after
+
+
+def fetch_cases(case_ids, journal, workers=8, rate=10.0, max_attempts=8, metrics=None):
+    # fetch cases on a thread pool - `workers` caps the number of requests in flight and `rate` caps
+    # requests per second across all of them (None/0 disables the limit)
+    # cases go straight to the journal as they arrive rather than piling up in memory
+    bucket = TokenBucket(rate, capacity=workers) if rate else None
+    metrics = metrics or ScrapeMetrics()
+    scheduler = RetryScheduler(case_ids, max_attempts=max_attempts)
+    in_flight = {}
+    resolved = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while scheduler.pending() or in_flight:
+            while len(in_flight) < workers:
+                case_id = scheduler.next_ready()
+                if case_id is None:
+                    break
+                in_flight[pool.submit(fetch_case, case_id, bucket, metrics)] = case_id
+
+            if not in_flight:
+                # everything left is waiting out a backoff
+                time.sleep(scheduler.next_wakeup_s())
+                continue
+
+            done, _ = wait(in_flight, timeout=scheduler.next_wakeup_s(), return_when=FIRST_COMPLETED)
+            for future in done:
+                case_id = in_flight.pop(future)
+                outcome, value, retry_after = future.result()
+
+                if outcome == "retry":
+                    delay_s = scheduler.retry(case_id, value, retry_after)
+                    if delay_s is not None:
+                        metrics.record_outcome(case_id, "retry", value)
+                        print(f"Retrying case ID {case_id} ({value}) in {delay_s:.1f} seconds")
+                        continue
+                    metrics.record_outcome(case_id, "gave_up", value)
+                    print(f"Giving up on case ID {case_id} after {max_attempts} attempts")
+                elif outcome == "ok":
+                    journal.append(value)
+                    metrics.record_outcome(case_id, "ok")
+                else:
+                    metrics.record_outcome(case_id, "404")
+
+                resolved += 1
+                metrics.maybe_report(resolved, len(case_ids))
+
+    if scheduler.gave_up:
+        print(f"Gave up on {len(scheduler.gave_up)} cases: {scheduler.gave_up}")
+
+
+def main(
+    workers=8,
+    rate=10.0,
+    max_attempts=8,
+    incremental=False,
+    snapshot=None,
+    refresh_fraction=0.01,
+    db=None,
+    report=None,
+    report_every_s=10.0,
+    pool_size=None,
+    connect_timeout=10,
+    read_timeout=60,
+):
+    # one pooled connection per worker unless told otherwise
+    configure_session(pool_size or workers, connect_timeout, read_timeout)
+    metrics = ScrapeMetrics(report_every_s=report_every_s)
+
+    states = get_states()
+    ids_by_state, _ = search_case_ids(
+        states, workers=workers, rate=rate, max_attempts=max_attempts, metrics=metrics
+    )
+    case_ids = [case_id for state in states for case_id in ids_by_state[state]]
+    metrics.state_of = {case_id: state for state in states for case_id in ids_by_state[state]}
+
+    # a case can show up under more than one state
+    case_ids = list(dict.fromkeys(case_ids))
+    print(f"Found {len(case_ids)} total ")
+
+    journal = CaseJournal()
+    if len(journal):
+        print(f"Resuming from {journal.path} with {len(journal)} cases already fetched")
+
+    to_fetch = case_ids
+    if incremental:
+        snapshot = snapshot or latest_snapshot()
+        if snapshot is None:
+            print("No stored snapshot found, falling back to a full scrape")
+        else:
+            stored = {case["id"]: case for case in load_stored_cases(snapshot)}
+            new_ids, refresh_ids = plan_incremental(case_ids, stored, refresh_fraction)
+            print(f"Loaded {len(stored)} cases from {snapshot}: {len(new_ids)} new, refreshing {len(refresh_ids)}")
+
+            # stored cases we are not refreshing go into the journal as-is, so the compacted snapshot is the full
+            # merged set; anything no longer returned by the search is dropped, the same as a full scrape would do
+            skip = set(new_ids) | set(refresh_ids)
+            for case_id in case_ids:
+                if case_id not in skip and case_id not in journal:
+                    journal.append(stored[case_id])
+            del stored
+
+            to_fetch = new_ids + refresh_ids
+
+    to_fetch = [case_id for case_id in to_fetch if case_id not in journal]
+    fetch_cases(to_fetch, journal, workers=workers, rate=rate, max_attempts=max_attempts, metrics=metrics)
+
+    if db is not None:
+        store = CaseStore(db)
+        print(f"Upserted {store.upsert_lines(journal.sorted_lines())} new or changed cases into {db}")
+        store.close()
+
+    path = journal.compact()
+    print(f"Saved {path}")
+
+    if report is None:
+        report = f"output/scrape-report-{datetime.datetime.now().strftime('%Y%m%d')}.json"
+    print(f"Wrote run report to {metrics.write_report(report)}")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape all NamUs missing persons cases.")
+    parser.add_argument("--workers", type=int, default=8, help="maximum number of case requests in flight")
+    parser.add_argument("--rate", type=float, default=10.0, help="maximum case requests per second (0 disables)")
+    parser.add_argument("--max-attempts", type=int, default=8, help="attempts per case before giving up on it")
+    parser.add_argument("--incremental", action="store_true", help="only fetch cases missing from the last snapshot")
+    parser.add_argument("--snapshot", help="snapshot to diff against (defaults to the newest output/namus-*.json)")
+    parser.add_argument("--refresh-fraction", type=float, default=0.01,
+                        help="fraction of already-stored cases to re-fetch in incremental mode")
+    parser.add_argument("--db", help="also upsert the scraped cases into this SQLite case store")
+    parser.add_argument("--report", help="where to write the JSON run report (defaults to output/scrape-report-DATE.json)")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument("--pool-size", type=int, help="keep-alive connections to keep open (defaults to --workers)")
+    parser.add_argument("--connect-timeout", type=float, default=10, help="seconds to wait for a connection")
+    parser.add_argument("--read-timeout", type=float, default=60, help="seconds to wait for a response")
+    parser.add_argument("--base-url", default=API_BASE, help="API root, e.g. a local stub server")
+    args = parser.parse_args()
+
+    API_BASE = args.base_url.rstrip("/")
+    main(
+        workers=args.workers,
+        rate=args.rate,
+        max_attempts=args.max_attempts,
+        incremental=args.incremental,
+        snapshot=args.snapshot,
+        refresh_fraction=args.refresh_fraction,
+        db=args.db,
+        report=args.report,
+        report_every_s=args.report_every,
+        pool_size=args.pool_size,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+    )
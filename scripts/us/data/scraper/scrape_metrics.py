@@ -0,0 +1,135 @@
+import collections
+import json
+import math
+import threading
+import time
+
+# latency histogram buckets: log-spaced from 1ms to ~2min with 4 buckets per doubling (~19% resolution), so
+# percentiles come out of a fixed-size array no matter how many requests we make
+BUCKETS_PER_DOUBLING = 4
+MAX_BUCKET = BUCKETS_PER_DOUBLING * 17
+
+
+def bucket_of(latency_s):
+    ms = latency_s * 1000
+    if ms <= 1:
+        return 0
+    return min(int(math.log2(ms) * BUCKETS_PER_DOUBLING) + 1, MAX_BUCKET)
+
+
+def bucket_upper_ms(bucket):
+    return pow(2, bucket / BUCKETS_PER_DOUBLING)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (MAX_BUCKET + 1)
+        self.total = 0
+        self.sum_s = 0.0
+        self.max_s = 0.0
+
+    def add(self, latency_s):
+        self.counts[bucket_of(latency_s)] += 1
+        self.total += 1
+        self.sum_s += latency_s
+        self.max_s = max(self.max_s, latency_s)
+
+    def percentile_ms(self, p):
+        # upper edge of the bucket holding the p-th percentile
+        if not self.total:
+            return None
+        rank = math.ceil(self.total * p / 100)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bucket_upper_ms(bucket), self.max_s * 1000), 1)
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "mean_ms": round(1000 * self.sum_s / self.total, 1) if self.total else None,
+            "p50_ms": self.percentile_ms(50),
+            "p95_ms": self.percentile_ms(95),
+            "p99_ms": self.percentile_ms(99),
+            "max_ms": round(self.max_s * 1000, 1),
+            "histogram_ms": {
+                f"<={bucket_upper_ms(bucket):.1f}": count for bucket, count in enumerate(self.counts) if count
+            },
+        }
+
+
+class ScrapeMetrics:
+    # shared by every fetch thread; `state_of` maps case ID -> state for the per-state counters
+    def __init__(self, state_of=None, report_every_s=10.0):
+        self.state_of = state_of or {}
+        self.report_every_s = report_every_s
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+        self.latency = collections.defaultdict(LatencyHistogram)  # per endpoint
+        self.requests = collections.Counter()  # per endpoint
+        self.statuses = collections.Counter()  # HTTP status, or failure class when there was no response
+        self.bytes = 0  # response bodies as sent over the wire (compressed)
+        self.outcomes = collections.Counter()
+        self.retries_by_class = collections.Counter()
+        self.per_state = collections.defaultdict(collections.Counter)
+
+    def record_request(self, endpoint, latency_s, status, nbytes=0):
+        with self.lock:
+            self.requests[endpoint] += 1
+            self.latency[endpoint].add(latency_s)
+            self.statuses[str(status)] += 1
+            self.bytes += nbytes
+
+    def record_outcome(self, case_id, outcome, failure_class=None):
+        # outcome is one of "ok", "404", "retry" or "gave_up"
+        state = self.state_of.get(case_id, "UNKNOWN")
+        with self.lock:
+            self.outcomes[outcome] += 1
+            self.per_state[state][outcome] += 1
+            if outcome == "retry":
+                self.retries_by_class[failure_class] += 1
+
+    def elapsed_s(self):
+        return time.monotonic() - self.started
+
+    def progress_line(self, done, total):
+        elapsed_s = self.elapsed_s()
+        requests_total = sum(self.requests.values())
+        cases = self.latency["case"]
+        return (
+            f"{done}/{total} cases ({100 * done / max(total, 1):.2f}%) | "
+            f"{requests_total / elapsed_s:.1f} req/s | "
+            f"p50 {cases.percentile_ms(50)}ms p95 {cases.percentile_ms(95)}ms p99 {cases.percentile_ms(99)}ms | "
+            f"{self.bytes / 1e6:.1f} MB | "
+            f"retries {self.outcomes['retry']} | 404s {self.outcomes['404']}"
+        )
+
+    def maybe_report(self, done, total):
+        # prints a progress line at most every `report_every_s` seconds
+        now = time.monotonic()
+        if now - self.last_report >= self.report_every_s or done == total:
+            self.last_report = now
+            print(self.progress_line(done, total))
+
+    def summary(self):
+        elapsed_s = self.elapsed_s()
+        with self.lock:
+            return {
+                "elapsed_s": round(elapsed_s, 1),
+                "requests": dict(self.requests),
+                "requests_per_s": round(sum(self.requests.values()) / elapsed_s, 2),
+                "bytes": self.bytes,
+                "statuses": dict(self.statuses),
+                "outcomes": dict(self.outcomes),
+                "retries_by_class": dict(self.retries_by_class),
+                "latency": {endpoint: hist.summary() for endpoint, hist in self.latency.items()},
+                "per_state": {state: dict(counts) for state, counts in sorted(self.per_state.items())},
+            }
+
+    def write_report(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
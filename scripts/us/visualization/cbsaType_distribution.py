@@ -1,7 +1,13 @@
+import sys
+from pathlib import Path
+
 import pandas as pd  
 import matplotlib.pyplot as plt
 
-df_primary = pd.read_csv(r'F:\dsl_CLIMA\projects\submittable\missing persons\export\mp_term.csv')
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.columnar import read_table
+
+df_primary = read_table(r'F:\dsl_CLIMA\projects\submittable\missing persons\export\mp_term.csv')
 df_primary['DisappearanceDate'] = pd.to_datetime(df_primary['DisappearanceDate'])
 
 df_primary = df_primary[
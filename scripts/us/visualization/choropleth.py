@@ -1,14 +1,21 @@
+import sys
+from pathlib import Path
+
 import geopandas as gpd
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.colors import LogNorm
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.columnar import read_table
+from common.geokeys import county_state, encode_county, encode_state
+
 # --------------------------------------------------
 # Load data
 # --------------------------------------------------
 
-df_namus = pd.read_csv(
+df_namus = read_table(
     r'export/mp_term.csv'
 )
 
@@ -45,23 +52,20 @@ gdf_states_2024 = gdf_states_2024[~gdf_states_2024['STATEFP'].isin(conus_states)
 # Prepare case counts
 # --------------------------------------------------
 
-df_namus['FIPS'] = (
-    df_namus['FIPS']
-    .astype(str)
-    .str.zfill(5)
-)
+# integer county keys on both sides (common/geokeys.py), whatever format FIPS came back in
+df_namus['county_key'] = encode_county(df_namus['FIPS'])
+gdf_2024['county_key'] = encode_county(gdf_2024['GEOID'])
 
 county_counts = (
     df_namus
-    .groupby('FIPS')
+    .groupby('county_key')
     .size()
     .reset_index(name='case_count')
 )
 
 gdf = gdf_2024.merge(
     county_counts,
-    left_on='GEOID',
-    right_on='FIPS',
+    on='county_key',
     how='left'
 )
 gdf['case_count'] = gdf['case_count'].fillna(0)
@@ -124,25 +128,20 @@ plt.show()
 # Prepare case counts (STATE-LEVEL)
 # --------------------------------------------------
 
-df_namus['FIPS'] = (
-    df_namus['FIPS']
-    .astype(str)
-    .str.zfill(5)
-)
-
-# Extract state FIPS (first 2 digits)
-df_namus['STATEFP'] = df_namus['FIPS'].str[:2]
+# State key from the county key (first 2 digits of the FIPS)
+df_namus['state_key'] = county_state(encode_county(df_namus['FIPS']))
+gdf_states_2024['state_key'] = encode_state(gdf_states_2024['STATEFP'])
 
 state_counts = (
     df_namus
-    .groupby('STATEFP')
+    .groupby('state_key')
     .size()
     .reset_index(name='case_count')
 )
 
 gdf = gdf_states_2024.merge(
     state_counts,
-    on='STATEFP',
+    on='state_key',
     how='left'
 )
 
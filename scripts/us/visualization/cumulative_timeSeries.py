@@ -1,8 +1,14 @@
+import sys
+from pathlib import Path
+
 import pandas as pd  
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
-df_primary = pd.read_csv(r'F:\dsl_CLIMA\projects\submittable\missing persons\export\mp_term.csv')
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.columnar import read_table
+
+df_primary = read_table(r'F:\dsl_CLIMA\projects\submittable\missing persons\export\mp_term.csv')
 df_msa = pd.read_csv(r'F:\dsl_CLIMA\projects\Missing Persons Project\msa_cases_by_MSAcode[2010-2024].csv')
 
 # --- Prepare and clean data
@@ -1,7 +1,14 @@
+import sys
+from pathlib import Path
+
 import pandas as pd
 import matplotlib.pyplot as plt
 
-df_namus = pd.read_csv(
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.columnar import read_table
+from common.names import normalize
+
+df_namus = read_table(
     r'export/mp_term.csv'
 )
 
@@ -12,8 +19,8 @@ df_namus = df_namus[
     (df_namus['DisappearanceDate'] < pd.to_datetime('2025-01-01'))
 ]
 
-df_namus['Sex'] = df_namus['Sex'].astype(str).str.strip().str.capitalize()
-df_namus['Ethnicity'] = df_namus['Ethnicity'].astype(str).str.strip()
+df_namus['Sex'] = normalize(df_namus['Sex'], 'capitalize')
+df_namus['Ethnicity'] = normalize(df_namus['Ethnicity'], 'strip')
 
 df_namus = df_namus.dropna(subset=['Sex', 'Ethnicity'])
 
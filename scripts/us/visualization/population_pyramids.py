@@ -1,9 +1,15 @@
+import sys
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 
-df_namus = pd.read_csv(
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.columnar import read_table
+
+df_namus = read_table(
     r'F:\dsl_CLIMA\projects\submittable\missing persons\export\mp_term.csv'
 )
 
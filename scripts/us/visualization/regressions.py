@@ -1,10 +1,16 @@
+import sys
+from pathlib import Path
+
 import pandas as pd  
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import statsmodels.api as sm
 
-df_primary = pd.read_csv(r'export/mp_term.csv')
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.columnar import read_table
+
+df_primary = read_table(r'export/mp_term.csv')
 df_primary['DisappearanceDate'] = pd.to_datetime(df_primary['DisappearanceDate'])
 
 df_primary = df_primary[